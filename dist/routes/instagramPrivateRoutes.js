@@ -18,6 +18,7 @@ import {
     igGetTimeline,
     igSendInitialDM,
     igSendMassDM,
+    igGetMassDMJob,
     igPrivateLogout
 } from '../services/instagramService.js';
 import { validateJwt } from '../config/jwt.js';
@@ -241,6 +242,20 @@ router.post('/send-mass-dm', validateJwt, async (req, res) => {
     }
 });
 
+/**
+ * Progreso de un envío masivo: { status, counts, sent, failed, total }.
+ */
+router.get('/send-mass-dm/:jobId', validateJwt, async (req, res) => {
+    try {
+        const userId = getUserId(req);
+        if (!userId) return res.status(401).json({ error: 'Unauthorized' });
+        const result = await igGetMassDMJob(req.params.jobId, userId);
+        res.json(result);
+    } catch (error) {
+        res.status(500).json({ success: false, error: error.message });
+    }
+});
+
 // ─────────────────────────────────────────────────────────
 // NUEVOS ENDPOINTS: Hashtags, Ubicaciones, Media, Timeline
 // ─────────────────────────────────────────────────────────
@@ -71,7 +71,9 @@ function emitToUserIG(userId, event, data) {
 async function _pyCall(method, urlPath, data = null, params = null) {
   try {
     const isHeavy = /\/(followers|following)/.test(urlPath);
-    const config = { method, url: `${PYTHON_IG_URL}${urlPath}`, timeout: isHeavy ? 150000 : 120000 };
+    const timeout = isHeavy ? 150000 : 120000;
+    // Tell the service how long we will wait so it stops working when we give up
+    const config = { method, url: `${PYTHON_IG_URL}${urlPath}`, timeout, headers: { 'X-Request-Timeout': String(timeout / 1000) } };
     if (data) config.data = data;
     if (params) config.params = params;
     const resp = await axios(config);
@@ -196,6 +198,11 @@ class PrivateAPIClient {
     });
   }
 
+  async getMassDMJob(jobId) {
+    if (!this.logged) throw new Error('Private API no conectada.');
+    return _pyCall('GET', `/dm/mass/${encodeURIComponent(jobId)}`);
+  }
+
   async getUserInfo(username) {
     if (!this.logged) throw new Error('Private API no conectada.');
     return this.limiter.schedule(() => _pyCall('GET', `/user/${encodeURIComponent(username)}/info`, null, { user_id: this.userId }));
@@ -1719,7 +1726,11 @@ export async function igSendInitialDM(recipientUsername, message, userId = null)
  * @param {string[]} recipientUsernames - Lista de usernames (con o sin @)
  * @param {string} message - Texto del mensaje. Opcional: usar {{username}} si useUsernameTemplate=true
  * @param {string} userId - ID del usuario en tu app (para la sesión IG)
- * @param {Object} options - { delayBetweenMs?: number, useUsernameTemplate?: boolean }
+ * @param {Object} options - { delayBetweenMs?: number, useUsernameTemplate?: boolean, wait?: boolean }
+ *
+ * El servicio Python encola el envío como un trabajo y responde al instante con job_id:
+ * el progreso se consulta con igGetMassDMJob. Con options.wait=true se espera a que
+ * el trabajo termine (puede tardar delayBetweenMs por destinatario).
  */
 export async function igSendMassDM(recipientUsernames, message, userId, options = {}) {
   try {
@@ -1753,19 +1764,68 @@ export async function igSendMassDM(recipientUsernames, message, userId, options
       delayBetweenMs: options.delayBetweenMs || 8000,
       useUsernameTemplate: !!options.useUsernameTemplate
     });
+    if (!result.success || !result.job_id) {
+      return { sent: [], failed: [], ...result };
+    }
+    if (!options.wait) {
+      return _massDMResult(result);
+    }
 
-    return {
-      success: result.failed.length === 0,
-      sent: result.sent,
-      failed: result.failed,
-      total: result.total
-    };
+    let job = result;
+    while (MASS_DM_ACTIVE_STATES.includes(job.status)) {
+      await new Promise((resolve) => setTimeout(resolve, MASS_DM_POLL_MS));
+      const next = await session.privateClient.getMassDMJob(result.job_id);
+      // Servicio caído un momento: seguir esperando con el último estado conocido
+      if (next.success) job = next;
+    }
+    return _massDMResult(job);
   } catch (error) {
     P.error(`❌ Error en igSendMassDM: ${error.message}`);
     return { success: false, error: error.message, sent: [], failed: [] };
   }
 }
 
+const MASS_DM_ACTIVE_STATES = ['queued', 'running'];
+const MASS_DM_POLL_MS = 5000;
+
+function _massDMResult(job) {
+  const done = !MASS_DM_ACTIVE_STATES.includes(job.status);
+  return {
+    success: done ? job.status === 'done' && job.failed.length === 0 : true,
+    job_id: job.job_id,
+    status: job.status,
+    error: job.error || undefined,
+    counts: job.counts,
+    sent: job.sent,
+    failed: job.failed,
+    total: job.total
+  };
+}
+
+/**
+ * Estado de un trabajo de DMs masivos (igSendMassDM)
+ * @param {string} jobId - job_id devuelto por igSendMassDM
+ * @param {string} userId - ID del usuario en tu app; solo puede consultar sus propios trabajos
+ */
+export async function igGetMassDMJob(jobId, userId) {
+  try {
+    const session = await _getConnectedSession(userId);
+    if (!session) return { success: false, error: 'No hay sesión activa' };
+    if (!session.privateClient.logged) {
+      return { success: false, error: 'Private API no conectada.' };
+    }
+    const job = await session.privateClient.getMassDMJob(jobId);
+    if (!job.success) return job;
+    if (String(job.user_id) !== String(userId)) {
+      return { success: false, error: 'Trabajo no encontrado.' };
+    }
+    return _massDMResult(job);
+  } catch (error) {
+    P.error(`❌ Error en igGetMassDMJob: ${error.message}`);
+    return { success: false, error: error.message };
+  }
+}
+
 /**
  * Logout de Private API
  */
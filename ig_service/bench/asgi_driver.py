@@ -0,0 +1,102 @@
+"""
+Minimal in-process ASGI client: drives the FastAPI app without sockets or httpx,
+so the benchmark measures the service rather than a network stack.
+"""
+
+import asyncio
+import json
+import time
+from typing import Optional
+from urllib.parse import urlencode
+
+
+class Response:
+    __slots__ = ("status", "headers", "body", "elapsed")
+
+    def __init__(self):
+        self.status = None
+        self.headers = []
+        self.body = b""
+        self.elapsed = 0.0
+
+    def json(self):
+        return json.loads(self.body)
+
+
+async def request(app, method: str, path: str, params: Optional[dict] = None,
+                  body=None, headers: Optional[dict] = None) -> Response:
+    raw = json.dumps(body).encode() if body is not None else b""
+    hdrs = [(b"host", b"bench"), (b"content-type", b"application/json"), (b"content-length", str(len(raw)).encode())]
+    hdrs += [(k.lower().encode(), str(v).encode()) for k, v in (headers or {}).items()]
+    scope = {
+        "type": "http",
+        "asgi": {"version": "3.0"},
+        "http_version": "1.1",
+        "method": method,
+        "scheme": "http",
+        "path": path,
+        "raw_path": path.encode(),
+        "root_path": "",
+        "query_string": urlencode(params or {}).encode(),
+        "headers": hdrs,
+        "client": ("127.0.0.1", 50000),
+        "server": ("bench", 80),
+    }
+    body_sent = False
+    disconnected = asyncio.Event()
+
+    async def receive():
+        nonlocal body_sent
+        if not body_sent:
+            body_sent = True
+            return {"type": "http.request", "body": raw, "more_body": False}
+        await disconnected.wait()
+        return {"type": "http.disconnect"}
+
+    resp = Response()
+
+    async def send(message):
+        if message["type"] == "http.response.start":
+            resp.status = message["status"]
+            resp.headers = message.get("headers", [])
+        elif message["type"] == "http.response.body":
+            resp.body += message.get("body", b"")
+            if not message.get("more_body"):
+                disconnected.set()
+
+    t0 = time.perf_counter()
+    await app(scope, receive, send)
+    resp.elapsed = time.perf_counter() - t0
+    disconnected.set()
+    return resp
+
+
+class Lifespan:
+    """async with Lifespan(app): runs the app's startup and shutdown handlers."""
+
+    def __init__(self, app):
+        self.app = app
+        self._events: asyncio.Queue = asyncio.Queue()
+        self._replies: asyncio.Queue = asyncio.Queue()
+        self._task = None
+
+    async def _receive(self):
+        return await self._events.get()
+
+    async def _send(self, message):
+        await self._replies.put(message)
+
+    async def __aenter__(self):
+        scope = {"type": "lifespan", "asgi": {"version": "3.0"}, "state": {}}
+        self._task = asyncio.ensure_future(self.app(scope, self._receive, self._send))
+        await self._events.put({"type": "lifespan.startup"})
+        reply = await self._replies.get()
+        if reply["type"] != "lifespan.startup.complete":
+            raise RuntimeError(f"startup failed: {reply}")
+        return self
+
+    async def __aexit__(self, *exc):
+        await self._events.put({"type": "lifespan.shutdown"})
+        await self._replies.get()
+        await self._task
+        return False
@@ -0,0 +1,126 @@
+"""
+Micro-benchmark for the list-endpoint hot path: formatting + JSON encoding.
+
+    python ig_service/bench/bench_format.py [--users 1000] [--media 300] [--repeat 20]
+
+Compares the previous getattr-based formatters and FastAPI's default response
+path (jsonable_encoder + JSONResponse) with serialization.py.
+"""
+
+import argparse
+import copy
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import JSONResponse
+from instagrapi.extractors import extract_media_v1, extract_user_short
+
+from bench.fixtures import raw_media, raw_user
+from serialization import FastJSONResponse, format_media, format_user, format_users, orjson
+
+
+# ─── Previous implementation (baseline) ───────────────────
+
+def legacy_format_user(u) -> dict:
+    return {
+        "pk": str(u.pk),
+        "username": getattr(u, "username", "") or "",
+        "full_name": getattr(u, "full_name", "") or "",
+        "is_private": getattr(u, "is_private", False),
+        "is_verified": getattr(u, "is_verified", False),
+        "profile_pic_url": str(u.profile_pic_url) if getattr(u, "profile_pic_url", None) else None,
+        "follower_count": getattr(u, "follower_count", None),
+        "following_count": getattr(u, "following_count", None),
+        "media_count": getattr(u, "media_count", None),
+        "is_business": getattr(u, "is_business_account", False) or getattr(u, "is_business", False),
+    }
+
+
+def legacy_format_media(m) -> dict:
+    image_url = None
+    if m.thumbnail_url:
+        image_url = str(m.thumbnail_url)
+    elif m.resources and len(m.resources) > 0:
+        image_url = str(m.resources[0].thumbnail_url) if m.resources[0].thumbnail_url else None
+    return {
+        "pk": str(m.pk),
+        "shortcode": m.code,
+        "media_type": m.media_type,
+        "caption": m.caption_text or "",
+        "like_count": m.like_count or 0,
+        "comment_count": m.comment_count or 0,
+        "taken_at": m.taken_at.isoformat() if m.taken_at else None,
+        "permalink": f"https://www.instagram.com/p/{m.code}/" if m.code else None,
+        "image_url": image_url,
+        "user": {
+            "pk": str(m.user.pk) if m.user else None,
+            "username": m.user.username if m.user else None,
+            "full_name": (m.user.full_name or "") if m.user else "",
+            "is_verified": getattr(m.user, "is_verified", False) if m.user else False,
+        } if m.user else None,
+    }
+
+
+def bench(label: str, fn, repeat: int) -> float:
+    fn()  # warm-up
+    best = float("inf")
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        fn()
+        best = min(best, time.perf_counter() - t0)
+    print(f"  {label:<58} {best * 1000:9.2f} ms")
+    return best
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--users", type=int, default=1000)
+    ap.add_argument("--media", type=int, default=300)
+    ap.add_argument("--repeat", type=int, default=20)
+    args = ap.parse_args()
+
+    raw_users = [raw_user(i) for i in range(args.users)]
+    users = [extract_user_short(copy.deepcopy(u)) for u in raw_users]
+    medias = [extract_media_v1(raw_media(i)) for i in range(args.media)]
+    assert [legacy_format_user(u) for u in users] == [format_user(u) for u in users]
+    assert [legacy_format_media(m) for m in medias] == [format_media(m) for m in medias]
+
+    print(f"orjson: {'yes' if orjson else 'no (stdlib json fallback)'}")
+    print(f"\n{args.users} followers, model -> dict")
+    old = bench("legacy _format_user", lambda: [legacy_format_user(u) for u in users], args.repeat)
+    new = bench("compiled format_user", lambda: [format_user(u) for u in users], args.repeat)
+    print(f"  speed-up: {old / new:.2f}x")
+
+    print(f"\n{args.users} followers, raw API dicts -> response body")
+    old = bench(
+        "extract_user_short + _format_user + jsonable_encoder + JSONResponse",
+        lambda: JSONResponse(jsonable_encoder({"followers": [legacy_format_user(extract_user_short(dict(u))) for u in raw_users]})),
+        args.repeat,
+    )
+    new = bench(
+        "format_user_raw + FastJSONResponse",
+        lambda: FastJSONResponse({"followers": format_users(raw_users)}),
+        args.repeat,
+    )
+    print(f"  speed-up: {old / new:.2f}x")
+
+    print(f"\n{args.media} media, model -> response body")
+    old = bench(
+        "_format_media + jsonable_encoder + JSONResponse",
+        lambda: JSONResponse(jsonable_encoder({"media": [legacy_format_media(m) for m in medias]})),
+        args.repeat,
+    )
+    new = bench(
+        "format_media + FastJSONResponse",
+        lambda: FastJSONResponse({"media": [format_media(m) for m in medias]}),
+        args.repeat,
+    )
+    print(f"  speed-up: {old / new:.2f}x")
+
+
+if __name__ == "__main__":
+    main()
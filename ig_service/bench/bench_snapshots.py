@@ -0,0 +1,109 @@
+"""
+Cost of diffing and intersecting follower snapshots (snapshots.py) for large accounts.
+
+    python ig_service/bench/bench_snapshots.py [--followers 1000000] [--churn 0.01]
+
+Two snapshots of the same account are written to a temporary store, with
+--churn of the followers replaced between them. Reported: time and peak extra
+memory of snapshots.diff on the memory-mapped files, of np.setdiff1d on the same
+arrays, and of the Node-style comparison (sets of PKs from the formatted user
+lists). The same is done for the audience overlap of the two snapshots
+(snapshots.intersect + snapshots.union against np.intersect1d + np.union1d and
+set & / |). Memory is peak traced allocations; mapped file pages are not included.
+"""
+
+import argparse
+import os
+import sys
+import tempfile
+import time
+import tracemalloc
+from pathlib import Path
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import numpy as np
+
+import snapshots
+
+
+def _users(pks: np.ndarray) -> list[dict]:
+    return [{"pk": str(pk), "username": f"user_{pk}", "full_name": "", "profile_pic_url": None,
+             "is_private": False, "is_verified": False} for pk in pks.tolist()]
+
+
+def _measure(fn, repeat: int):
+    best = float("inf")
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        result = fn()
+        best = min(best, time.perf_counter() - t0)
+    tracemalloc.start()
+    fn()
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return result, best * 1000, peak / 2 ** 20
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--followers", type=int, default=1_000_000)
+    ap.add_argument("--churn", type=float, default=0.01)
+    ap.add_argument("--repeat", type=int, default=5)
+    args = ap.parse_args()
+
+    rng = np.random.default_rng(1)
+    old = np.unique(rng.integers(1, 60_000_000_000, size=args.followers, dtype=np.int64))
+    changed = int(len(old) * args.churn)
+    keep = np.delete(old, rng.choice(len(old), size=changed, replace=False))
+    new = np.unique(np.concatenate([keep, rng.integers(60_000_000_000, 70_000_000_000, size=changed, dtype=np.int64)]))
+
+    with tempfile.TemporaryDirectory() as tmp:
+        store = snapshots.FollowerSnapshotStore(Path(tmp), keep=10)
+        t0 = time.perf_counter()
+        base = store.save("1", _users(old), True)
+        time.sleep(0.002)
+        current = store.save("1", _users(new), True)
+        save_ms = (time.perf_counter() - t0) * 1000 / 2
+        size_mb = (Path(tmp) / "1" / f"{int(current['taken_at'] * 1000)}.npy").stat().st_size / 2 ** 20
+
+        (added, removed), mmap_ms, mmap_mb = _measure(
+            lambda: snapshots.diff(store.load("1", base), store.load("1", current)), args.repeat)
+        _, np_ms, np_mb = _measure(
+            lambda: (np.setdiff1d(new, old, assume_unique=True), np.setdiff1d(old, new, assume_unique=True)), args.repeat)
+        old_users, new_users = _users(old), _users(new)
+
+        def _node_style():
+            before = {u["pk"] for u in old_users}
+            after = {u["pk"] for u in new_users}
+            return after - before, before - after
+
+        (node_added, node_removed), node_ms, node_mb = _measure(_node_style, 1)
+
+        (shared, either), ov_ms, ov_mb = _measure(
+            lambda: (snapshots.intersect(store.load("1", base), store.load("1", current)),
+                     snapshots.union(store.load("1", base), store.load("1", current))), args.repeat)
+        _, np_ov_ms, np_ov_mb = _measure(
+            lambda: (np.intersect1d(old, new, assume_unique=True), np.union1d(old, new)), args.repeat)
+
+        def _node_overlap():
+            before = {u["pk"] for u in old_users}
+            after = {u["pk"] for u in new_users}
+            return before & after, before | after
+
+        (node_shared, node_either), node_ov_ms, node_ov_mb = _measure(_node_overlap, 1)
+
+    assert len(added) == len(node_added) == changed and len(removed) == len(node_removed) == changed
+    assert len(shared) == len(node_shared) and len(either) == len(node_either)
+    print(f"{len(old):,} followers, {changed:,} replaced | snapshot file {size_mb:.1f} MB, save {save_ms:.0f} ms (incl. profiles)")
+    print(f"{'method':<40} {'time':>10} {'peak mem':>10}")
+    print(f"{'snapshots.diff (mmap, sliced)':<40} {mmap_ms:8.1f}ms {mmap_mb:8.1f}MB")
+    print(f"{'np.setdiff1d (in memory)':<40} {np_ms:8.1f}ms {np_mb:8.1f}MB")
+    print(f"{'set() of formatted user PKs':<40} {node_ms:8.1f}ms {node_mb:8.1f}MB")
+    print(f"{'snapshots.intersect + union (mmap)':<40} {ov_ms:8.1f}ms {ov_mb:8.1f}MB")
+    print(f"{'np.intersect1d + np.union1d':<40} {np_ov_ms:8.1f}ms {np_ov_mb:8.1f}MB")
+    print(f"{'set & and | of formatted user PKs':<40} {node_ov_ms:8.1f}ms {node_ov_mb:8.1f}MB")
+
+
+if __name__ == "__main__":
+    main()
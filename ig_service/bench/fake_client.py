@@ -0,0 +1,240 @@
+"""
+Deterministic stand-in for instagrapi.Client, used by the offline benchmarks.
+
+It implements the Client surface main.py touches, returns real instagrapi
+models (or raw private API dicts where main.py uses them), sleeps to simulate
+upstream latency and injects errors at a configurable rate. Nothing leaves
+the process.
+"""
+
+import random
+import threading
+import time
+from dataclasses import dataclass, field
+
+from instagrapi.exceptions import (
+    ChallengeRequired,
+    ClientError,
+    LoginRequired,
+    PleaseWaitFewMinutes,
+    UserNotFound,
+)
+from instagrapi.extractors import extract_media_v1, extract_user_short, extract_user_v1
+from instagrapi.types import Hashtag, Location
+
+from bench.fixtures import raw_media, raw_user, raw_user_info
+
+_ERRORS = {
+    "please_wait": lambda: PleaseWaitFewMinutes("Please wait a few minutes before you try again."),
+    "login_required": lambda: LoginRequired("login_required"),
+    "challenge": lambda: ChallengeRequired("challenge_required"),
+    "client_error": lambda: ClientError("Bad request"),
+}
+
+
+@dataclass
+class FakeConfig:
+    latency: float = 0.05            # seconds per upstream request
+    jitter: float = 0.2              # +/- fraction of latency
+    page_size: int = 100             # users per followers/following page
+    media_page_size: int = 12        # items per media feed page
+    followers: int = 2000            # followers (and following) per target user
+    follower_churn: int = 20         # followers replaced each time a list is fetched again from the start
+    media: int = 120                 # posts per user / hashtag / location feed
+    timeline_items: int = 20
+    likers: int = 200
+    search_results: int = 20
+    error_rate: float = 0.0          # probability that a request fails
+    error_kinds: list = field(default_factory=lambda: ["please_wait", "client_error"])
+    slow_rate: float = 0.0           # probability that a request takes slow_seconds
+    slow_seconds: float = 30.0
+    seed: int = 1
+
+
+class FakeClient:
+    def __init__(self, config: FakeConfig = None, proxy=None, account: int = 0):
+        self.config = config or FakeConfig()
+        self._rng = random.Random(self.config.seed * 7919 + account)
+        self._rng_lock = threading.Lock()
+        self.user_id = str(9000000 + account)
+        self.username = f"bench_{account}"
+        self.password = ""
+        self.rank_token = f"{self.user_id}_rank"
+        self.request_timeout = 20
+        self.delay_range = [0, 0]
+        self.challenge_code_handler = None
+        self.last_json = {}
+        self.settings = {"authorization_data": {"ds_user_id": self.user_id, "sessionid": f"{self.user_id}%3Abench"}}
+        self.calls = 0
+        self._list_fetches: dict[str, int] = {}
+
+    # ─── Simulation ───────────────────────────────────────
+
+    def _request(self):
+        """One simulated round trip: latency, then maybe an injected error."""
+        cfg = self.config
+        with self._rng_lock:
+            self.calls += 1
+            slow = self._rng.random() < cfg.slow_rate
+            fail = self._rng.random() < cfg.error_rate
+            kind = self._rng.choice(cfg.error_kinds) if fail and cfg.error_kinds else None
+            delay = cfg.latency * (1 + cfg.jitter * (self._rng.random() * 2 - 1))
+        time.sleep(cfg.slow_seconds if slow else max(0.0, delay))
+        if kind:
+            raise _ERRORS[kind]()
+
+    @staticmethod
+    def _index(username: str) -> int:
+        """Stable numeric id for a username; user_<n> maps to n."""
+        name = username.lower().lstrip("@")
+        if name.startswith("user_") and name[5:].isdigit():
+            return int(name[5:])
+        return sum(ord(c) * 31 ** k for k, c in enumerate(name)) % 1000000
+
+    # ─── Session / auth ───────────────────────────────────
+
+    def get_settings(self) -> dict:
+        return dict(self.settings)
+
+    def set_settings(self, settings: dict):
+        self.settings = dict(settings)
+        return True
+
+    def login(self, username: str, password: str, *args, **kwargs):
+        self._request()
+        self.username, self.password = username, password
+        return True
+
+    def login_by_sessionid(self, sessionid: str):
+        self._request()
+        return True
+
+    def account_info(self):
+        self._request()
+        return extract_user_v1(raw_user_info(self._index(self.username)))
+
+    def logout(self):
+        return True
+
+    def challenge_resolve_auto(self, *args, **kwargs):
+        return True
+
+    # ─── Users ────────────────────────────────────────────
+
+    def user_info_by_username_v1(self, username: str):
+        self._request()
+        if username.lower().startswith("ghost"):
+            raise UserNotFound(username)
+        return extract_user_v1(raw_user_info(self._index(username)))
+
+    def user_info_v1(self, user_id):
+        self._request()
+        return extract_user_v1(raw_user_info(int(user_id) - 1000000))
+
+    def search_users_v1(self, query: str, count: int = 50):
+        self._request()
+        base = self._index(query)
+        exact = [extract_user_short(raw_user(base))]
+        exact[0].username = query.lower()
+        return exact + [extract_user_short(raw_user(base + k)) for k in range(1, min(count, self.config.search_results))]
+
+    def _follow_page(self, user_id, count: int, max_id: str) -> tuple[list, str]:
+        start = int(max_id or 0)
+        end = min(self.config.followers, start + min(count or self.config.page_size, self.config.page_size))
+        # Every fetch from the first page sees the list shifted by follower_churn users,
+        # so consecutive snapshots of an account differ (some followed, some unfollowed)
+        with self._rng_lock:
+            if not start:
+                self._list_fetches[str(user_id)] = self._list_fetches.get(str(user_id), -1) + 1
+            fetch = self._list_fetches.get(str(user_id), 0)
+        base = int(user_id) * 7 % 100000 + fetch * self.config.follower_churn
+        users = [raw_user(base + i) for i in range(start, end)]
+        return users, str(end) if end < self.config.followers else None
+
+    def private_request(self, endpoint: str, params: dict = None, **kwargs):
+        self._request()
+        params = params or {}
+        if endpoint.startswith("friendships/"):
+            users, next_max_id = self._follow_page(endpoint.split("/")[1], int(params.get("count", 0)), params.get("max_id"))
+            self.last_json = {"users": users, "next_max_id": next_max_id, "status": "ok"}
+            return self.last_json
+        raise ClientError(f"FakeClient does not implement {endpoint}")
+
+    def public_request(self, url: str, *args, **kwargs):
+        self._request()
+        raise ClientError(f"FakeClient does not implement {url}")
+
+    def user_followers_v1_chunk(self, user_id: str, max_amount: int = 0, max_id: str = ""):
+        self._request()
+        users, nxt = self._follow_page(user_id, max_amount, max_id)
+        return [extract_user_short(u) for u in users], nxt
+
+    user_following_v1_chunk = user_followers_v1_chunk
+
+    def user_followers_gql_chunk(self, user_id: str, max_amount: int = 0, end_cursor: str = None):
+        self._request()
+        users, nxt = self._follow_page(user_id, max_amount or 50, end_cursor or "")
+        return [extract_user_short(u) for u in users], nxt
+
+    def user_following_gql(self, user_id: str, amount: int = 0):
+        self._request()
+        users, _ = self._follow_page(user_id, amount or self.config.followers, "")
+        return [extract_user_short(u) for u in users]
+
+    # ─── Search / media ───────────────────────────────────
+
+    def search_hashtags(self, query: str, count: int = 20):
+        self._request()
+        return [Hashtag(id=str(self._index(query) + k), name=f"{query}{k or ''}", media_count=1000 - k)
+                for k in range(min(count, self.config.search_results))]
+
+    def search_places_v1(self, query: str):
+        self._request()
+        base = self._index(query)
+        return [Location(pk=base + k, name=f"{query} {k}", address=f"Calle {k}", city="Madrid",
+                         lat=40.4 + k / 1000, lng=-3.7 - k / 1000, external_source="facebook_places")
+                for k in range(self.config.search_results)]
+
+    def _media_page(self, seed: int, cursor) -> tuple[list, str]:
+        start = int(cursor or 0)
+        end = min(self.config.media, start + self.config.media_page_size)
+        return [extract_media_v1(raw_media(seed + i)) for i in range(start, end)], (str(end) if end < self.config.media else "")
+
+    def user_medias_paginated_v1(self, user_id, amount: int = 0, end_cursor: str = ""):
+        self._request()
+        return self._media_page(int(user_id) % 100000, end_cursor)
+
+    def hashtag_medias_v1_chunk(self, name: str, max_amount: int = 27, tab_key: str = "", max_id: str = None):
+        self._request()
+        return self._media_page(self._index(name), max_id)
+
+    def location_medias_v1_chunk(self, location_pk: int, max_amount: int = 63, tab_key: str = "", max_id: str = None):
+        self._request()
+        return self._media_page(int(location_pk) % 100000, max_id)
+
+    def media_pk_from_code(self, code: str) -> str:
+        return str(3000000000000000000 + self._index(code))
+
+    def media_info(self, media_pk):
+        self._request()
+        return extract_media_v1(raw_media(int(media_pk) - 3000000000000000000))
+
+    def media_likers(self, media_pk):
+        self._request()
+        return [extract_user_short(raw_user(i)) for i in range(self.config.likers)]
+
+    def get_timeline_feed(self, *args, **kwargs):
+        self._request()
+        items = []
+        for i in range(self.config.timeline_items):
+            m = raw_media(i)
+            if i % 5 == 4:
+                # Incomplete payload: exercises the media_info fallback
+                m = {"pk": m["pk"], "id": m["id"]}
+            items.append({"media_or_ad": m})
+        self.last_json = {"feed_items": items}
+        return self.last_json
+
+    def direct_send(self, text: str, user_ids: list = None, thread_ids: list = None):
+        self._request()
+        return type("DirectMessage", (), {"thread_id": f"t{user_ids[0] if user_ids else 0}"})()
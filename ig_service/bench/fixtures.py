@@ -0,0 +1,54 @@
+"""Deterministic Instagram API payloads shared by the benchmarks."""
+
+from datetime import datetime, timezone
+
+_EPOCH = int(datetime(2024, 1, 1, tzinfo=timezone.utc).timestamp())
+
+
+def raw_user(i: int) -> dict:
+    """A user as returned in private API lists (friendships, likers, search)."""
+    return {
+        "pk": str(1000000 + i),
+        "pk_id": str(1000000 + i),
+        "username": f"user_{i}",
+        "full_name": f"User Número {i}",
+        "is_private": i % 3 == 0,
+        "is_verified": i % 50 == 0,
+        "profile_pic_url": f"https://scontent.cdninstagram.com/v/t51.2885-19/{i}_n.jpg?stp=dst-jpg_s150x150&_nc_ht=scontent&oh=00_{i:08x}",
+        "profile_pic_id": f"{i}_{i}",
+        "has_anonymous_profile_picture": False,
+        "latest_reel_media": 0,
+    }
+
+
+def raw_user_info(i: int) -> dict:
+    """A full profile as returned by users/{pk}/info or users/{username}/usernameinfo."""
+    return {
+        **raw_user(i),
+        "biography": f"Bio {i} · enlaces y contacto",
+        "external_url": None,
+        "follower_count": 1000 + i * 7,
+        "following_count": 300 + i,
+        "media_count": 40 + i % 100,
+        "is_business": i % 4 == 0,
+        "pinned_channels_info": {"pinned_channels_list": []},
+    }
+
+
+def raw_media(i: int) -> dict:
+    """A feed item as returned by the private API (user feed, hashtag, location, timeline)."""
+    return {
+        "pk": 3000000000000000000 + i,
+        "id": f"{3000000000000000000 + i}_{i}",
+        "code": f"C{i:010d}",
+        "taken_at": _EPOCH + i,
+        "media_type": 1,
+        "product_type": "feed",
+        "caption": {"text": f"Post {i} #tag"},
+        "like_count": i * 3,
+        "comment_count": i,
+        "user": raw_user(i),
+        "image_versions2": {"candidates": [
+            {"url": f"https://scontent.cdninstagram.com/{i}.jpg", "width": 1080, "height": 1080, "scans_profile": ""},
+        ]},
+    }
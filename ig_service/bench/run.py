@@ -0,0 +1,294 @@
+"""
+Offline load benchmark for ig_service: every route, fake Instagram, no network.
+
+    python ig_service/bench/run.py --concurrency 64 --requests 3000
+    python ig_service/bench/run.py --routes followers,user_info --latency 0.02 --json out.json
+    python ig_service/bench/run.py --baseline base.json --max-regression 0.10   # gate: exit 1 on regression
+
+Every Client the service creates or hydrates is a bench.fake_client.FakeClient,
+so latency, page sizes, data volumes and error rates are all configurable.
+Requests go through the full ASGI app (middleware, validation, handlers) with
+an in-process driver. Reported: req/s, p50/p99 per route and overall, event
+loop lag (p99/max of a 10 ms ticker) and peak RSS.
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import random
+import resource
+import sys
+import tempfile
+import time
+from collections import defaultdict
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+# Must be set before main is imported: the session store opens at import time
+os.environ.setdefault("IG_STATE_DIR", tempfile.mkdtemp(prefix="ig_bench_"))
+
+import logging
+
+from bench.asgi_driver import Lifespan, request
+from bench.fake_client import FakeClient, FakeConfig
+
+
+def _pct(values: list, q: float) -> float:
+    if not values:
+        return 0.0
+    values = sorted(values)
+    return values[min(len(values) - 1, int(q * len(values)))]
+
+
+# ─── Routes ───────────────────────────────────────────────
+# name -> (weight, builder(rng, account) -> (method, path, params, body))
+
+def _target(rng, n: int) -> str:
+    return f"user_{rng.randrange(n)}"
+
+
+def _neighbours(rng, n: int, k: int) -> list:
+    """k consecutive targets; neighbouring targets share most of their fake followers."""
+    start = rng.randrange(n)
+    return [f"user_{(start + i) % n}" for i in range(k)]
+
+
+def build_routes(args) -> dict:
+    n = args.usernames
+    return {
+        "search_users": (4, lambda r, a: ("GET", "/search/users", {"q": _target(r, n), "limit": 10, "user_id": a}, None)),
+        "search_hashtags": (2, lambda r, a: ("GET", "/search/hashtags", {"q": f"tag{r.randrange(n)}", "user_id": a}, None)),
+        "search_locations": (1, lambda r, a: ("GET", "/search/locations", {"q": f"place{r.randrange(n)}", "user_id": a}, None)),
+        "user_info": (8, lambda r, a: ("GET", f"/user/{_target(r, n)}/info", {"user_id": a}, None)),
+        "users_info_batch": (1, lambda r, a: ("POST", "/users/info", None,
+                                              {"user_id": a, "usernames": [_target(r, n) for _ in range(20)]})),
+        "followers": (3, lambda r, a: ("GET", f"/user/{_target(r, n)}/followers", {"limit": args.list_limit, "user_id": a}, None)),
+        "followers_stream": (1, lambda r, a: ("GET", f"/user/{_target(r, n)}/followers",
+                                              {"limit": args.list_limit, "user_id": a, "stream": "ndjson"}, None)),
+        "followers_diff": (1, lambda r, a: ("GET", f"/user/{_target(r, n)}/followers/diff", {"user_id": a, "profiles": "true"}, None)),
+        "audience_overlap": (1, lambda r, a: ("POST", "/audience/overlap", None,
+                                              {"user_id": a, "usernames": _neighbours(r, n, 3), "sample": 10})),
+        "following": (2, lambda r, a: ("GET", f"/user/{_target(r, n)}/following", {"limit": args.list_limit, "user_id": a}, None)),
+        "user_media": (3, lambda r, a: ("GET", f"/user/{_target(r, n)}/media", {"limit": 24, "user_id": a}, None)),
+        "hashtag_media": (2, lambda r, a: ("GET", f"/hashtag/tag{r.randrange(n)}/media", {"limit": 30, "user_id": a}, None)),
+        "location_media": (1, lambda r, a: ("GET", f"/location/{r.randrange(n) + 1}/media", {"limit": 30, "user_id": a}, None)),
+        "post_likers": (1, lambda r, a: ("POST", "/post/likers", None,
+                                         {"post_url": f"https://www.instagram.com/p/C{r.randrange(n):010d}/", "user_id": a, "limit": 100})),
+        "timeline": (2, lambda r, a: ("GET", "/timeline", {"limit": 20, "user_id": a}, None)),
+        "dm_send": (1, lambda r, a: ("POST", "/dm/send", None, {"recipient_username": _target(r, n), "text": "hola", "user_id": a})),
+        "dm_mass": (1, lambda r, a: ("POST", "/dm/mass", None, {"recipient_usernames": [_target(r, n)], "message": "hola", "user_id": a})),
+        "dm_mass_status": (1, lambda r, a: ("GET", "/dm/mass/unknown-job", None, None)),
+        "dm_mass_cancel": (1, lambda r, a: ("POST", "/dm/mass/unknown-job/cancel", None, None)),
+        "health": (1, lambda r, a: ("GET", "/health", None, None)),
+        "metrics": (1, lambda r, a: ("GET", "/metrics", None, None)),
+        # Short profiles under load; overlapping ones get a 409
+        "debug_profile": (1, lambda r, a: ("GET", "/debug/profile", {"seconds": 0.2, "interval_ms": 5}, None)),
+        # Auth flows run on their own accounts so they never log out a data account
+        "login": (1, lambda r, a: ("POST", "/login", None, {"username": f"bench_{a}", "password": "x", "user_id": f"auth-{a}"})),
+        "login_by_sessionid": (1, lambda r, a: ("POST", "/login-by-sessionid", None, {"session_id": "1%3Abench", "user_id": f"auth-{a}"})),
+        "restore_session": (1, lambda r, a: ("POST", "/restore-session", None, {"user_id": f"auth-{a}"})),
+        "two_factor": (1, lambda r, a: ("POST", "/2fa", None, {"code": "000000", "user_id": f"auth-{a}"})),
+        "challenge_code": (1, lambda r, a: ("POST", "/challenge/code", None, {"code": "000000", "user_id": f"auth-{a}"})),
+        "challenge_retry": (1, lambda r, a: ("POST", "/challenge/retry", None, {"user_id": f"auth-{a}"})),
+        "logout": (1, lambda r, a: ("POST", "/logout", None, {"user_id": f"auth-{a}"})),
+    }
+
+
+def _uncovered(app, routes: dict) -> list:
+    """App routes no benchmark route exercises (docs/openapi excluded)."""
+    probes = [build(random.Random(0), "bench-0")[:2] for _, build in routes.values()]
+    missing = []
+    for route in app.routes:
+        methods = getattr(route, "methods", None)
+        if not methods or route.path.startswith(("/docs", "/redoc", "/openapi")):
+            continue
+        if not any(m in methods and route.path_regex.match(p) for m, p in probes):
+            missing.append(route.path)
+    return missing
+
+
+# ─── Runner ───────────────────────────────────────────────
+
+async def _loop_lag_monitor(samples: list, stop: asyncio.Event, interval: float = 0.01):
+    loop = asyncio.get_running_loop()
+    while not stop.is_set():
+        t0 = loop.time()
+        await asyncio.sleep(interval)
+        samples.append(max(0.0, loop.time() - t0 - interval))
+
+
+async def run(args) -> dict:
+    import main
+
+    config = FakeConfig(
+        latency=args.latency, jitter=args.jitter, page_size=args.page_size, followers=args.followers,
+        follower_churn=args.follower_churn, media=args.media, error_rate=args.error_rate, error_kinds=args.error_kinds.split(","),
+        slow_rate=args.slow_rate, slow_seconds=args.slow_seconds, seed=args.seed,
+    )
+    counter = iter(range(10 ** 9))
+    main.Client = lambda proxy=None, **kw: FakeClient(config, proxy=proxy, account=next(counter))
+    accounts = [f"bench-{i}" for i in range(args.accounts)]
+    for a in accounts:
+        main.clients[a] = FakeClient(config, account=next(counter))
+
+    routes = build_routes(args)
+    if args.routes:
+        wanted = args.routes.split(",")
+        unknown = [r for r in wanted if r not in routes]
+        if unknown:
+            raise SystemExit(f"unknown routes: {', '.join(unknown)} (available: {', '.join(routes)})")
+        routes = {k: routes[k] for k in wanted}
+    else:
+        missing = _uncovered(main.app, routes)
+        if missing:
+            print(f"warning: routes not exercised: {', '.join(missing)}", file=sys.stderr)
+
+    names = list(routes)
+    weights = [routes[k][0] for k in names]
+    rng = random.Random(args.seed)
+    plan = [(name, rng.choice(accounts)) for name in rng.choices(names, weights, k=args.requests)]
+
+    latencies = defaultdict(list)
+    statuses = defaultdict(lambda: defaultdict(int))
+    failures = defaultdict(int)
+    lag: list = []
+    stop = asyncio.Event()
+    queue: asyncio.Queue = asyncio.Queue()
+    for i, item in enumerate(plan):
+        queue.put_nowait((i, item))
+
+    async def worker():
+        while True:
+            try:
+                i, (name, account) = queue.get_nowait()
+            except asyncio.QueueEmpty:
+                return
+            method, path, params, body = routes[name][1](random.Random(args.seed * 100003 + i), account)
+            try:
+                resp = await request(main.app, method, path, params, body)
+            except Exception as e:
+                failures[name] += 1
+                statuses[name][type(e).__name__] += 1
+                continue
+            latencies[name].append(resp.elapsed)
+            statuses[name][resp.status] += 1
+            if resp.status >= 500:
+                failures[name] += 1
+
+    async with Lifespan(main.app):
+        monitor = asyncio.ensure_future(_loop_lag_monitor(lag, stop))
+        t0 = time.perf_counter()
+        await asyncio.gather(*(worker() for _ in range(args.concurrency)))
+        wall = time.perf_counter() - t0
+        stop.set()
+        await monitor
+
+    all_lat = [v for vals in latencies.values() for v in vals]
+    report = {
+        "config": {k: v for k, v in vars(args).items() if k not in ("json", "baseline")},
+        "requests": len(plan),
+        "wall_s": round(wall, 3),
+        "rps": round(len(plan) / wall, 1) if wall else 0.0,
+        "p50_ms": round(_pct(all_lat, 0.50) * 1000, 2),
+        "p99_ms": round(_pct(all_lat, 0.99) * 1000, 2),
+        "loop_lag_p99_ms": round(_pct(lag, 0.99) * 1000, 2),
+        "loop_lag_max_ms": round(max(lag, default=0.0) * 1000, 2),
+        "peak_rss_mb": round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, 1),
+        "failures": sum(failures.values()),
+        "routes": {
+            name: {
+                "count": len(latencies[name]),
+                "p50_ms": round(_pct(latencies[name], 0.50) * 1000, 2),
+                "p99_ms": round(_pct(latencies[name], 0.99) * 1000, 2),
+                "statuses": {str(k): v for k, v in statuses[name].items()},
+                "failures": failures[name],
+            }
+            for name in names
+        },
+    }
+    return report
+
+
+def print_report(report: dict):
+    print(f"\n{'route':<20} {'count':>6} {'p50 ms':>9} {'p99 ms':>9}  statuses")
+    for name, r in report["routes"].items():
+        statuses = " ".join(f"{k}:{v}" for k, v in sorted(r["statuses"].items()))
+        print(f"{name:<20} {r['count']:>6} {r['p50_ms']:>9.2f} {r['p99_ms']:>9.2f}  {statuses}")
+    print(
+        f"\n{report['requests']} requests in {report['wall_s']}s -> {report['rps']} req/s | "
+        f"p50 {report['p50_ms']} ms, p99 {report['p99_ms']} ms | "
+        f"loop lag p99 {report['loop_lag_p99_ms']} ms, max {report['loop_lag_max_ms']} ms | "
+        f"peak RSS {report['peak_rss_mb']} MB | failures {report['failures']}"
+    )
+
+
+def check_gates(report: dict, args) -> list[str]:
+    """Threshold and baseline checks; returns the failed ones."""
+    failed = []
+    limits = [
+        ("rps", args.min_rps, lambda v, lim: v >= lim, ">="),
+        ("p99_ms", args.max_p99_ms, lambda v, lim: v <= lim, "<="),
+        ("loop_lag_p99_ms", args.max_loop_lag_ms, lambda v, lim: v <= lim, "<="),
+        ("peak_rss_mb", args.max_rss_mb, lambda v, lim: v <= lim, "<="),
+        ("failures", args.max_failures, lambda v, lim: v <= lim, "<="),
+    ]
+    for key, limit, ok, op in limits:
+        if limit is not None and not ok(report[key], limit):
+            failed.append(f"{key}={report[key]} (required {op} {limit})")
+    if args.baseline:
+        with open(args.baseline, encoding="utf-8") as fh:
+            base = json.load(fh)
+        tol = args.max_regression
+        if report["rps"] < base["rps"] * (1 - tol):
+            failed.append(f"rps {report['rps']} regressed vs baseline {base['rps']} (>{tol:.0%})")
+        for key in ("p50_ms", "p99_ms", "loop_lag_p99_ms"):
+            if base.get(key) and report[key] > base[key] * (1 + tol):
+                failed.append(f"{key} {report[key]} regressed vs baseline {base[key]} (>{tol:.0%})")
+    return failed
+
+
+def main_cli(argv=None) -> int:
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("--requests", type=int, default=2000)
+    ap.add_argument("--concurrency", type=int, default=64)
+    ap.add_argument("--accounts", type=int, default=8, help="connected accounts (one FakeClient each)")
+    ap.add_argument("--usernames", type=int, default=500, help="distinct target usernames (controls cache hit rate)")
+    ap.add_argument("--routes", default="", help="comma-separated subset of routes (default: all)")
+    ap.add_argument("--list-limit", type=int, default=200, help="limit for followers/following requests")
+    ap.add_argument("--latency", type=float, default=0.02, help="simulated upstream latency per request (s)")
+    ap.add_argument("--jitter", type=float, default=0.2)
+    ap.add_argument("--page-size", type=int, default=100)
+    ap.add_argument("--followers", type=int, default=2000)
+    ap.add_argument("--follower-churn", type=int, default=20, help="followers replaced between two fetches of a list")
+    ap.add_argument("--media", type=int, default=120)
+    ap.add_argument("--error-rate", type=float, default=0.0)
+    ap.add_argument("--error-kinds", default="please_wait,client_error")
+    ap.add_argument("--slow-rate", type=float, default=0.0, help="fraction of upstream calls that hang")
+    ap.add_argument("--slow-seconds", type=float, default=30.0)
+    ap.add_argument("--seed", type=int, default=1)
+    ap.add_argument("--json", help="write the report to this file")
+    ap.add_argument("--baseline", help="report JSON to compare against")
+    ap.add_argument("--max-regression", type=float, default=0.10, help="allowed regression vs baseline (fraction)")
+    ap.add_argument("--min-rps", type=float)
+    ap.add_argument("--max-p99-ms", type=float)
+    ap.add_argument("--max-loop-lag-ms", type=float)
+    ap.add_argument("--max-rss-mb", type=float)
+    ap.add_argument("--max-failures", type=int)
+    ap.add_argument("--verbose", action="store_true", help="keep the service's INFO logs")
+    args = ap.parse_args(argv)
+
+    if not args.verbose:
+        logging.disable(logging.WARNING)
+    report = asyncio.run(run(args))
+    print_report(report)
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as fh:
+            json.dump(report, fh, indent=2)
+    failed = check_gates(report, args)
+    for f in failed:
+        print(f"GATE FAILED: {f}", file=sys.stderr)
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main_cli())
@@ -0,0 +1,146 @@
+"""
+Per-account circuit breakers for upstream Instagram calls.
+
+A rate limit (please_wait, HTTP 429), a challenge or an IP block opens the account's
+breaker at once; timeouts open it after a few in a row. While open, calls fail
+immediately with the seconds left (retry_after) instead of waiting on a request
+Instagram is going to refuse. When the open period ends a single call goes
+through as a probe: success closes the breaker, another trip re-opens it for
+twice as long (up to a cap). Any other outcome counts as success, since the
+upstream answered.
+
+Only accounts that are not healthy are tracked. Used from the event loop only.
+"""
+
+import time
+from typing import Optional
+
+CLOSED, OPEN, HALF_OPEN = "closed", "open", "half_open"
+
+# Error kinds (see main._error_kind) that open the breaker on the first occurrence
+TRIP_KINDS = frozenset({"please_wait", "throttled", "challenge", "ip_blacklisted"})
+# Outcomes that say nothing about upstream: the call never finished or never started
+NEUTRAL_KINDS = frozenset({"cancelled", "overloaded"})
+
+
+class CircuitOpen(Exception):
+    """Raised instead of calling upstream while an account's breaker is open."""
+
+    def __init__(self, retry_after: float, kind: str):
+        self.retry_after = max(1, int(retry_after + 0.999))
+        self.kind = kind
+        super().__init__(f"Instagram está limitando esta cuenta. Inténtalo de nuevo en {self.retry_after} s.")
+
+
+class _Breaker:
+    __slots__ = ("state", "kind", "opened_until", "open_seconds", "timeouts", "probing")
+
+    def __init__(self):
+        self.state = CLOSED
+        self.kind = None
+        self.opened_until = 0.0
+        self.open_seconds = 0.0
+        self.timeouts = 0
+        self.probing = False
+
+
+class AccountBreakers:
+    def __init__(self, open_seconds: float, max_open_seconds: float, timeout_threshold: int,
+                 on_trip=None):
+        self.open_seconds = open_seconds
+        self.max_open_seconds = max_open_seconds
+        self.timeout_threshold = timeout_threshold
+        # Optional on_trip(kind) hook, for metrics
+        self.on_trip = on_trip
+        self._accounts: dict[str, _Breaker] = {}
+        self.trips = 0
+        self.rejected = 0
+
+    def before_call(self, account: str) -> bool:
+        """
+        Raise CircuitOpen if the call must not go upstream. Returns True when the
+        call is the half-open probe; pass that back to after_call.
+        """
+        b = self._accounts.get(account)
+        if b is None or b.state == CLOSED:
+            return False
+        now = time.monotonic()
+        if b.state == OPEN and now >= b.opened_until:
+            b.state = HALF_OPEN
+        if b.state == HALF_OPEN and not b.probing:
+            b.probing = True
+            return True
+        self.rejected += 1
+        # While a probe is in flight, come back shortly
+        raise CircuitOpen(b.opened_until - now if b.state == OPEN else 5, b.kind)
+
+    def after_call(self, account: str, kind: Optional[str], probe: bool = False):
+        """Record an admitted call's outcome: kind is None on success, else the error kind ("cancelled" if it never finished)."""
+        b = self._accounts.get(account)
+        if b is not None and b.state != CLOSED and not probe:
+            # Admitted before the breaker opened: only the probe decides
+            return
+        if kind in NEUTRAL_KINDS:
+            if b is not None:
+                b.probing = False
+            return
+        if kind in TRIP_KINDS or (kind == "timeout" and probe):
+            self._trip(account, kind)
+        elif kind == "timeout":
+            b = b or self._accounts.setdefault(account, _Breaker())
+            b.timeouts += 1
+            if b.timeouts >= self.timeout_threshold:
+                self._trip(account, kind)
+        elif b is not None:
+            # Upstream answered: back to normal
+            del self._accounts[account]
+
+    def _trip(self, account: str, kind: str):
+        b = self._accounts.setdefault(account, _Breaker())
+        # A failed probe doubles the open period
+        b.open_seconds = min(self.max_open_seconds, b.open_seconds * 2 if b.state == HALF_OPEN else self.open_seconds)
+        b.state = OPEN
+        b.kind = kind
+        b.opened_until = time.monotonic() + b.open_seconds
+        b.timeouts = 0
+        b.probing = False
+        self.trips += 1
+        if self.on_trip is not None:
+            self.on_trip(kind)
+
+    def retry_after(self, account: str) -> float:
+        """Seconds until the account's breaker lets a call through (0 if it would now)."""
+        b = self._accounts.get(account)
+        if b is None or b.state != OPEN:
+            return 0.0
+        return max(0.0, b.opened_until - time.monotonic())
+
+    def reset(self, account: str):
+        """Forget the account's state, e.g. after a successful login or challenge."""
+        self._accounts.pop(account, None)
+
+    def states(self) -> dict[str, int]:
+        counts = {OPEN: 0, HALF_OPEN: 0}
+        now = time.monotonic()
+        for b in self._accounts.values():
+            if b.state == OPEN:
+                counts[HALF_OPEN if now >= b.opened_until else OPEN] += 1
+            elif b.state == HALF_OPEN:
+                counts[HALF_OPEN] += 1
+        return counts
+
+    def stats(self) -> dict:
+        now = time.monotonic()
+        return {
+            **self.states(),
+            "trips": self.trips,
+            "rejected": self.rejected,
+            "accounts": {
+                account: {
+                    "state": b.state if b.state != OPEN or now < b.opened_until else HALF_OPEN,
+                    "kind": b.kind,
+                    "retry_after": round(max(0.0, b.opened_until - now), 1) if b.state == OPEN else 0,
+                }
+                for account, b in self._accounts.items() if b.state != CLOSED
+            },
+        }
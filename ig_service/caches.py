@@ -0,0 +1,144 @@
+"""
+In-memory caches shared by every account connected to ig_service.
+All caches are thread-safe: they are read and written from instagrapi worker threads.
+"""
+
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Optional
+
+_MISSING = object()
+
+
+class TTLCache:
+    """Bounded LRU cache whose entries expire after a per-entry TTL."""
+
+    def __init__(self, maxsize: int, ttl: float):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._data: OrderedDict = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key, default=None):
+        now = time.monotonic()
+        with self._lock:
+            entry = self._data.get(key, _MISSING)
+            if entry is _MISSING or entry[1] <= now:
+                if entry is not _MISSING:
+                    del self._data[key]
+                self.misses += 1
+                return default
+            self._data.move_to_end(key)
+            self.hits += 1
+            return entry[0]
+
+    def set(self, key, value, ttl: Optional[float] = None):
+        expires = time.monotonic() + (self.ttl if ttl is None else ttl)
+        with self._lock:
+            self._data[key] = (value, expires)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def pop(self, key, default=None):
+        with self._lock:
+            entry = self._data.pop(key, _MISSING)
+        return default if entry is _MISSING else entry[0]
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+    def __len__(self):
+        return len(self._data)
+
+    def stats(self) -> dict[str, Any]:
+        total = self.hits + self.misses
+        return {
+            "size": len(self._data),
+            "maxsize": self.maxsize,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / total, 4) if total else 0.0,
+        }
+
+
+class SWRCache:
+    """
+    Stale-while-revalidate cache. Entries younger than fresh_ttl are served as-is;
+    entries up to stale_ttl old are served while at most one refresh per key runs.
+    """
+
+    def __init__(self, maxsize: int, fresh_ttl: float, stale_ttl: float):
+        self.maxsize = maxsize
+        self.fresh_ttl = fresh_ttl
+        self.stale_ttl = stale_ttl
+        self._data: OrderedDict = OrderedDict()
+        self._refreshing: set = set()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.stale_hits = 0
+        self.misses = 0
+        self.refreshes = 0
+
+    def get(self, key, max_age: Optional[float] = None) -> Optional[tuple[Any, float, bool]]:
+        """Return (value, age_seconds, is_stale), or None when there is no usable entry."""
+        limit = self.stale_ttl if max_age is None else min(self.stale_ttl, max_age)
+        now = time.monotonic()
+        with self._lock:
+            entry = self._data.get(key, _MISSING)
+            if entry is _MISSING:
+                self.misses += 1
+                return None
+            value, stored_at = entry
+            age = now - stored_at
+            if age > self.stale_ttl:
+                del self._data[key]
+            if age > limit:
+                self.misses += 1
+                return None
+            self._data.move_to_end(key)
+            stale = age > self.fresh_ttl
+            if stale:
+                self.stale_hits += 1
+            else:
+                self.hits += 1
+            return value, age, stale
+
+    def set(self, key, value):
+        with self._lock:
+            self._data[key] = (value, time.monotonic())
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def begin_refresh(self, key) -> bool:
+        """Claim the single refresh slot for key. False if one is already running."""
+        with self._lock:
+            if key in self._refreshing:
+                return False
+            self._refreshing.add(key)
+            self.refreshes += 1
+            return True
+
+    def end_refresh(self, key):
+        with self._lock:
+            self._refreshing.discard(key)
+
+    def __len__(self):
+        return len(self._data)
+
+    def stats(self) -> dict[str, Any]:
+        total = self.hits + self.stale_hits + self.misses
+        return {
+            "size": len(self._data),
+            "maxsize": self.maxsize,
+            "hits": self.hits,
+            "stale_hits": self.stale_hits,
+            "misses": self.misses,
+            "refreshes": self.refreshes,
+            "hit_rate": round((self.hits + self.stale_hits) / total, 4) if total else 0.0,
+        }
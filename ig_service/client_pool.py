@@ -0,0 +1,190 @@
+"""
+Bounded registries for per-account state that used to grow forever:
+live instagrapi Clients and pending 2FA / challenge entries.
+"""
+
+import threading
+import time
+from collections import OrderedDict
+from typing import Callable, Optional
+
+_MISSING = object()
+
+
+class ClientPool:
+    """
+    LRU registry of live Clients with an idle TTL and a size cap. It behaves like
+    the dict it replaces (get / [] / in / pop / len). Evicted clients are handed to
+    on_evict (which persists their session) and come back through lazy hydration
+    on next use. can_evict lets the caller protect accounts with work in flight.
+    """
+
+    def __init__(self, max_size: int, idle_ttl: float,
+                 on_evict: Optional[Callable] = None, can_evict: Optional[Callable] = None):
+        self.max_size = max_size
+        self.idle_ttl = idle_ttl
+        self.on_evict = on_evict
+        self.can_evict = can_evict
+        self._data: OrderedDict = OrderedDict()
+        self._lock = threading.RLock()
+        self.evictions_idle = 0
+        self.evictions_capacity = 0
+
+    def get(self, user_id: str, default=None):
+        with self._lock:
+            entry = self._data.get(user_id)
+            if entry is None:
+                return default
+            self._data[user_id] = (entry[0], time.monotonic())
+            self._data.move_to_end(user_id)
+            return entry[0]
+
+    def __getitem__(self, user_id: str):
+        cl = self.get(user_id)
+        if cl is None:
+            raise KeyError(user_id)
+        return cl
+
+    def __setitem__(self, user_id: str, cl):
+        with self._lock:
+            self._data[user_id] = (cl, time.monotonic())
+            self._data.move_to_end(user_id)
+            evicted = self._evict_over_capacity(keep=user_id)
+        self._dispatch(evicted)
+
+    def __contains__(self, user_id: str) -> bool:
+        return user_id in self._data
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+    def pop(self, user_id: str, default=None):
+        with self._lock:
+            entry = self._data.pop(user_id, None)
+        return entry[0] if entry else default
+
+    def _evictable(self, user_id: str) -> bool:
+        return self.can_evict is None or self.can_evict(user_id)
+
+    def _evict_over_capacity(self, keep: str) -> list:
+        evicted = []
+        if len(self._data) <= self.max_size:
+            return evicted
+        for user_id in list(self._data):
+            if len(self._data) <= self.max_size:
+                break
+            if user_id == keep or not self._evictable(user_id):
+                continue
+            evicted.append((user_id, self._data.pop(user_id)[0]))
+            self.evictions_capacity += 1
+        return evicted
+
+    def evict_idle(self) -> int:
+        cutoff = time.monotonic() - self.idle_ttl
+        with self._lock:
+            evicted = []
+            for user_id, (cl, last_used) in list(self._data.items()):
+                # Ordered by last use: everything after the first recent entry is recent too
+                if last_used > cutoff:
+                    break
+                if not self._evictable(user_id):
+                    continue
+                evicted.append((user_id, self._data.pop(user_id)[0]))
+                self.evictions_idle += 1
+        self._dispatch(evicted)
+        return len(evicted)
+
+    def _dispatch(self, evicted: list):
+        if self.on_evict is None:
+            return
+        for user_id, cl in evicted:
+            self.on_evict(user_id, cl)
+
+    def stats(self) -> dict:
+        return {
+            "size": len(self._data),
+            "max_size": self.max_size,
+            "idle_ttl": self.idle_ttl,
+            "evictions_idle": self.evictions_idle,
+            "evictions_capacity": self.evictions_capacity,
+        }
+
+
+class ExpiringDict:
+    """
+    Small dict whose entries expire ttl seconds after they were set. With a
+    backing (load / save / delete, see session_store.PendingState) sets and pops
+    are written through and a local miss falls back to it, so entries survive a
+    restart or a move to another worker.
+    """
+
+    def __init__(self, ttl: float, backing=None):
+        self.ttl = ttl
+        self.backing = backing
+        self._data: dict = {}
+        self._lock = threading.Lock()
+        self.expired = 0
+
+    def __setitem__(self, key, value):
+        with self._lock:
+            self._data[key] = (value, time.monotonic() + self.ttl)
+        if self.backing is not None:
+            self.backing.save(key, value, self.ttl)
+
+    def get(self, key, default=None):
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is not None and entry[1] <= time.monotonic():
+                del self._data[key]
+                self.expired += 1
+                entry = None
+        if entry is not None:
+            return entry[0]
+        if self.backing is None:
+            return default
+        stored = self.backing.load(key)
+        if stored is None:
+            return default
+        value, left = stored
+        with self._lock:
+            self._data.setdefault(key, (value, time.monotonic() + left))
+        return value
+
+    def __getitem__(self, key):
+        value = self.get(key, _MISSING)
+        if value is _MISSING:
+            raise KeyError(key)
+        return value
+
+    def __contains__(self, key) -> bool:
+        return self.get(key, _MISSING) is not _MISSING
+
+    def holds(self, key) -> bool:
+        """Like `in`, without falling back to the backing (no I/O)."""
+        with self._lock:
+            entry = self._data.get(key)
+        return entry is not None and entry[1] > time.monotonic()
+
+    def pop(self, key, default=None):
+        with self._lock:
+            entry = self._data.pop(key, None)
+        if self.backing is not None:
+            stored = self.backing.load(key) if entry is None else None
+            self.backing.delete(key)
+            if stored is not None:
+                return stored[0]
+        if entry is None or entry[1] <= time.monotonic():
+            return default
+        return entry[0]
+
+    def purge(self) -> int:
+        now = time.monotonic()
+        with self._lock:
+            stale = [k for k, (_, expires) in self._data.items() if expires <= now]
+            for k in stale:
+                del self._data[k]
+            self.expired += len(stale)
+        return len(stale)
+
+    def __len__(self) -> int:
+        return len(self._data)
@@ -0,0 +1,480 @@
+"""
+Multi-process mode: a supervisor that runs IG_WORKERS copies of main:app on
+local ports, plus a reverse proxy on PORT that sends each request to the worker
+owning its account.
+
+    IG_WORKERS=4 python cluster.py
+
+The routing key is user_id, from the query string or the JSON body; requests for
+/dm/mass/{job_id} are routed by the job's account. Other requests without an
+account (/health) go round-robin unless X-IG-Worker pins a worker index, and
+GET /cluster/health describes the workers. GET /metrics without X-IG-Worker
+scrapes every worker and returns their samples labelled worker="<index>", so one
+scrape target sees the whole cluster. Ownership comes from sharding.py,
+which the workers use too: a worker only resumes the mass DM jobs of the
+accounts it owns. Sessions and pending 2FA / challenge state are in the shared
+session store, so accounts that move after a resize keep their login.
+Crashed workers are restarted. With IG_WORKERS=1 this just execs uvicorn main:app.
+"""
+
+import asyncio
+import itertools
+import json
+import logging
+import os
+import re
+import subprocess
+import sys
+import time
+from pathlib import Path
+from typing import Optional
+from urllib.parse import parse_qs
+
+import dm_jobs
+import sharding
+
+logger = logging.getLogger("ig_service")
+
+HERE = Path(__file__).resolve().parent
+HOST = os.environ.get("HOST", "0.0.0.0")
+PORT = int(os.environ.get("PORT", "5002"))
+# Same default as main.py
+STATE_DIR = Path(os.environ.get("IG_STATE_DIR") or HERE.parent / "storage" / "ig_state")
+
+# Worker i listens on 127.0.0.1:(IG_WORKER_BASE_PORT + i)
+IG_WORKER_BASE_PORT = int(os.environ.get("IG_WORKER_BASE_PORT", "7100"))
+IG_WORKER_START_TIMEOUT = int(os.environ.get("IG_WORKER_START_TIMEOUT", "60"))
+# Idle keep-alive connections kept per worker, and how long one may sit idle
+# (the workers run with a longer keep-alive timeout, so a reused one is still open)
+IG_PROXY_POOL_SIZE = int(os.environ.get("IG_PROXY_POOL_SIZE", "32"))
+IG_PROXY_IDLE_TIMEOUT = 30
+_WORKER_KEEP_ALIVE = 75
+
+# Per-worker wait when /metrics scrapes the whole cluster
+IG_METRICS_SCRAPE_TIMEOUT = 5
+
+_JOB_PATH = re.compile(r"^/dm/mass/([0-9a-f]+)(?:/|$)")
+# Not forwarded in either direction; content-length is recomputed for requests
+_HOP_BY_HOP = frozenset({
+    b"connection", b"keep-alive", b"proxy-connection", b"transfer-encoding", b"te", b"trailer", b"upgrade",
+})
+
+
+class UpstreamError(Exception):
+    pass
+
+
+class Worker:
+    def __init__(self, index: int, port: int):
+        self.index = index
+        self.port = port
+        self.proc: Optional[subprocess.Popen] = None
+        self.restarts = 0
+        self.started_at = 0.0
+        self._idle: list = []  # (reader, writer, idle_since)
+
+    def start(self):
+        env = {**os.environ, "IG_WORKERS": str(sharding.IG_WORKERS), "IG_WORKER_INDEX": str(self.index)}
+        self.proc = subprocess.Popen(
+            [sys.executable, "-m", "uvicorn", "main:app", "--app-dir", str(HERE),
+             "--host", "127.0.0.1", "--port", str(self.port), "--timeout-keep-alive", str(_WORKER_KEEP_ALIVE)],
+            cwd=str(HERE), env=env,
+        )
+        self.started_at = time.time()
+        logger.info(f"Worker {self.index} started (pid={self.proc.pid}, port={self.port})")
+
+    @property
+    def alive(self) -> bool:
+        return self.proc is not None and self.proc.poll() is None
+
+    async def wait_ready(self, timeout: float):
+        deadline = time.monotonic() + timeout
+        while time.monotonic() < deadline:
+            if not self.alive:
+                raise RuntimeError(f"worker {self.index} exited with code {self.proc.returncode}")
+            try:
+                _, writer = await asyncio.open_connection("127.0.0.1", self.port)
+                writer.close()
+                return
+            except OSError:
+                await asyncio.sleep(0.2)
+        raise RuntimeError(f"worker {self.index} not listening after {timeout}s")
+
+    async def connect(self) -> tuple:
+        """(reader, writer, reused): an idle keep-alive connection if one is fresh enough."""
+        cutoff = time.monotonic() - IG_PROXY_IDLE_TIMEOUT
+        while self._idle:
+            reader, writer, idle_since = self._idle.pop()
+            if idle_since > cutoff and not writer.is_closing() and not reader.at_eof():
+                return reader, writer, True
+            writer.close()
+        reader, writer = await asyncio.open_connection("127.0.0.1", self.port)
+        return reader, writer, False
+
+    def release(self, reader, writer):
+        if len(self._idle) < IG_PROXY_POOL_SIZE and not writer.is_closing():
+            self._idle.append((reader, writer, time.monotonic()))
+        else:
+            writer.close()
+
+    def drop_idle(self):
+        for _, writer, _ in self._idle:
+            writer.close()
+        self._idle.clear()
+
+    def stop(self, timeout: float):
+        if not self.alive:
+            return
+        self.proc.terminate()
+        try:
+            self.proc.wait(timeout)
+        except subprocess.TimeoutExpired:
+            logger.warning(f"Worker {self.index} did not stop in {timeout}s, killing it")
+            self.proc.kill()
+            self.proc.wait()
+
+    def describe(self) -> dict:
+        return {
+            "index": self.index,
+            "port": self.port,
+            "pid": self.proc.pid if self.proc else None,
+            "alive": self.alive,
+            "restarts": self.restarts,
+            "uptime_s": round(time.time() - self.started_at) if self.alive else 0,
+        }
+
+
+async def _read_head(reader) -> tuple[int, list]:
+    status_line = await reader.readline()
+    if not status_line:
+        raise ConnectionResetError("upstream closed the connection")
+    status = int(status_line.split(b" ", 2)[1])
+    headers = []
+    while True:
+        line = await reader.readline()
+        if line in (b"\r\n", b"\n", b""):
+            break
+        name, _, value = line.partition(b":")
+        headers.append((name.strip().lower(), value.strip()))
+    return status, headers
+
+
+def _with_worker(sample: str, index: int) -> str:
+    """A Prometheus sample line with worker="index" added to its labels."""
+    label = f'worker="{index}"'
+    brace, space = sample.find("{"), sample.find(" ")
+    if brace != -1 and brace < space:
+        return f"{sample[:brace + 1]}{label},{sample[brace + 1:]}"
+    return f"{sample[:space]}{{{label}}}{sample[space:]}"
+
+
+def _merge_metrics(texts: dict) -> str:
+    """
+    One exposition from the workers' (index -> text, None if it did not answer):
+    every sample gets a worker label, and each family's samples stay together
+    under a single HELP/TYPE header as the text format requires.
+    """
+    families: dict[str, list] = {}  # name -> [header lines, samples]
+    for index, text in texts.items():
+        if text is None:
+            continue
+        family = families.setdefault("", [[], []])
+        for line in text.splitlines():
+            if not line:
+                continue
+            if line.startswith("#"):
+                parts = line.split(" ", 3)
+                if len(parts) >= 3 and parts[1] in ("HELP", "TYPE"):
+                    family = families.setdefault(parts[2], [[], []])
+                    if line not in family[0]:
+                        family[0].append(line)
+                continue
+            family[1].append(_with_worker(line, index))
+    lines = [
+        "# HELP ig_cluster_worker_up Whether the worker answered this scrape",
+        "# TYPE ig_cluster_worker_up gauge",
+    ] + [f'ig_cluster_worker_up{{worker="{i}"}} {int(text is not None)}' for i, text in texts.items()]
+    for header, samples in families.values():
+        lines += header + samples
+    return "\n".join(lines) + "\n"
+
+
+class ClusterProxy:
+    """ASGI app: supervises the workers (lifespan) and forwards HTTP requests to them."""
+
+    def __init__(self, workers: list[Worker]):
+        self.workers = workers
+        self._rr = itertools.cycle(range(len(workers)))
+        self._stopping = False
+        self._supervisor: Optional[asyncio.Task] = None
+        self.jobs: Optional[dm_jobs.DMJobStore] = None
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] == "lifespan":
+            await self._lifespan(receive, send)
+        elif scope["type"] == "http":
+            await self._http(scope, receive, send)
+
+    # ─── Supervision ──────────────────────────────────────
+
+    async def _lifespan(self, receive, send):
+        while True:
+            message = await receive()
+            if message["type"] == "lifespan.startup":
+                try:
+                    await self._startup()
+                except Exception as e:
+                    logger.error(f"Cluster startup failed: {e}")
+                    await asyncio.to_thread(self._stop_workers)
+                    await send({"type": "lifespan.startup.failed", "message": str(e)})
+                    return
+                await send({"type": "lifespan.startup.complete"})
+            elif message["type"] == "lifespan.shutdown":
+                await self._shutdown()
+                await send({"type": "lifespan.shutdown.complete"})
+                return
+
+    async def _startup(self):
+        STATE_DIR.mkdir(parents=True, exist_ok=True)
+        self.jobs = dm_jobs.DMJobStore(STATE_DIR / "ig_dm_jobs.sqlite3")
+        for w in self.workers:
+            w.start()
+        await asyncio.gather(*(w.wait_ready(IG_WORKER_START_TIMEOUT) for w in self.workers))
+        self._supervisor = asyncio.ensure_future(self._supervise())
+        logger.info(f"Cluster ready: {len(self.workers)} workers behind :{PORT}")
+
+    async def _supervise(self):
+        while not self._stopping:
+            await asyncio.sleep(1)
+            for w in self.workers:
+                if w.alive or self._stopping:
+                    continue
+                w.drop_idle()
+                w.restarts += 1
+                logger.error(f"Worker {w.index} exited with code {w.proc.returncode}; restarting (#{w.restarts})")
+                # Back off if it keeps crashing at startup
+                await asyncio.sleep(min(30, 2 ** min(w.restarts - 1, 5)) if time.time() - w.started_at < 10 else 0)
+                if not self._stopping:
+                    w.start()
+
+    def _stop_workers(self):
+        for w in self.workers:
+            if w.alive:
+                w.proc.terminate()
+        for w in self.workers:
+            w.stop(timeout=25)
+
+    async def _shutdown(self):
+        self._stopping = True
+        if self._supervisor:
+            self._supervisor.cancel()
+        for w in self.workers:
+            w.drop_idle()
+        await asyncio.to_thread(self._stop_workers)
+        if self.jobs:
+            self.jobs.close()
+        logger.info("Cluster stopped")
+
+    # ─── Routing ──────────────────────────────────────────
+
+    async def _route(self, scope, headers: dict, body: bytes) -> Worker:
+        pin = headers.get(b"x-ig-worker", b"").decode("latin-1")
+        if pin.isdigit() and int(pin) < len(self.workers):
+            return self.workers[int(pin)]
+        user_id = parse_qs(scope.get("query_string", b"").decode("latin-1")).get("user_id", [None])[0]
+        if not user_id and body and b"json" in headers.get(b"content-type", b""):
+            try:
+                payload = json.loads(body)
+                if isinstance(payload, dict) and payload.get("user_id") is not None:
+                    user_id = str(payload["user_id"])
+            except ValueError:
+                pass
+        if not user_id:
+            m = _JOB_PATH.match(scope["path"])
+            if m and self.jobs is not None:
+                user_id = await asyncio.to_thread(self.jobs.owner, m.group(1))
+        if user_id:
+            return self.workers[sharding.owner_of(user_id)]
+        return self.workers[next(self._rr)]
+
+    # ─── Forwarding ───────────────────────────────────────
+
+    async def _http(self, scope, receive, send):
+        if scope["path"] == "/cluster/health":
+            return await self._send_json(send, 200, self.health())
+        body = b""
+        while True:
+            message = await receive()
+            if message["type"] == "http.disconnect":
+                return
+            body += message.get("body", b"")
+            if not message.get("more_body"):
+                break
+        headers = dict(scope["headers"])
+        if scope["path"] == "/metrics" and scope["method"] == "GET" and b"x-ig-worker" not in headers:
+            return await self._send_metrics(send)
+        worker = await self._route(scope, headers, body)
+        # A client that goes away cancels the forward, which closes the upstream
+        # connection so the worker sees the disconnect too
+        forward = asyncio.ensure_future(self._forward(worker, scope, body, send))
+        disconnect = asyncio.ensure_future(receive())
+        await asyncio.wait({forward, disconnect}, return_when=asyncio.FIRST_COMPLETED)
+        disconnect.cancel()
+        if not forward.done():
+            forward.cancel()
+        try:
+            await forward
+        except asyncio.CancelledError:
+            pass
+        except UpstreamError as e:
+            logger.warning(f"Worker {worker.index} unavailable for {scope['method']} {scope['path']}: {e}")
+            await self._send_json(
+                send, 503,
+                {"success": False, "error": "Servicio reiniciándose, inténtalo de nuevo en unos segundos."},
+                [(b"retry-after", b"2")],
+            )
+
+    def _request_head(self, scope, body: bytes) -> bytes:
+        target = scope.get("raw_path") or scope["path"].encode("utf-8")
+        if scope.get("query_string"):
+            target += b"?" + scope["query_string"]
+        lines = [scope["method"].encode("ascii") + b" " + target + b" HTTP/1.1"]
+        for name, value in scope["headers"]:
+            if name not in _HOP_BY_HOP and name not in (b"content-length", b"expect"):
+                lines.append(name + b": " + value)
+        client = scope.get("client")
+        if client:
+            lines.append(b"x-forwarded-for: " + client[0].encode("latin-1"))
+        lines.append(b"content-length: " + str(len(body)).encode("ascii"))
+        return b"\r\n".join(lines) + b"\r\n\r\n"
+
+    async def _open(self, worker: Worker, head: bytes, body: bytes):
+        """Send the request; a pooled connection the worker already closed is retried once on a new one."""
+        for _ in range(2):
+            try:
+                reader, writer, reused = await worker.connect()
+            except OSError as e:
+                raise UpstreamError(str(e)) from e
+            try:
+                writer.write(head + body)
+                await writer.drain()
+                status, headers = await _read_head(reader)
+                return reader, writer, status, headers
+            except (OSError, asyncio.IncompleteReadError, ValueError, IndexError) as e:
+                writer.close()
+                if not reused:
+                    raise UpstreamError(str(e)) from e
+        raise UpstreamError("no usable connection")
+
+    async def _forward(self, worker: Worker, scope, body: bytes, send):
+        reader, writer, status, headers = await self._open(worker, self._request_head(scope, body), body)
+        values = dict(headers)
+        chunked = b"chunked" in values.get(b"transfer-encoding", b"").lower()
+        length = values.get(b"content-length")
+        keep_alive = values.get(b"connection", b"").lower() != b"close"
+        out = [(k, v) for k, v in headers if k not in _HOP_BY_HOP]
+        out.append((b"x-ig-worker", str(worker.index).encode("ascii")))
+        await send({"type": "http.response.start", "status": status, "headers": out})
+        reusable = False
+        try:
+            if scope["method"] == "HEAD" or status in (204, 304) or status < 200:
+                reusable = keep_alive
+            elif chunked:
+                while True:
+                    size = int((await reader.readline()).split(b";", 1)[0], 16)
+                    if size == 0:
+                        while (await reader.readline()) not in (b"\r\n", b"\n", b""):
+                            pass
+                        break
+                    chunk = await reader.readexactly(size)
+                    await reader.readexactly(2)
+                    await send({"type": "http.response.body", "body": chunk, "more_body": True})
+                reusable = keep_alive
+            elif length is not None:
+                left = int(length)
+                while left > 0:
+                    chunk = await reader.read(min(left, 65536))
+                    if not chunk:
+                        raise asyncio.IncompleteReadError(b"", left)
+                    left -= len(chunk)
+                    await send({"type": "http.response.body", "body": chunk, "more_body": True})
+                reusable = keep_alive
+            else:
+                while chunk := await reader.read(65536):
+                    await send({"type": "http.response.body", "body": chunk, "more_body": True})
+            await send({"type": "http.response.body", "body": b"", "more_body": False})
+        except Exception as e:
+            # Worker died mid-response: the client gets a truncated body
+            reusable = False
+            logger.warning(f"Proxying {scope['method']} {scope['path']} to worker {worker.index} aborted: {e!r}")
+        finally:
+            if reusable:
+                worker.release(reader, writer)
+            else:
+                writer.close()
+
+    async def _scrape(self, worker: Worker) -> Optional[str]:
+        """The worker's own /metrics text, or None if it does not answer in time."""
+        head = b"GET /metrics HTTP/1.1\r\nhost: 127.0.0.1\r\ncontent-length: 0\r\n\r\n"
+
+        async def _get():
+            reader, writer, status, headers = await self._open(worker, head, b"")
+            try:
+                body = await reader.readexactly(int(dict(headers).get(b"content-length", b"0")))
+            except BaseException:
+                writer.close()
+                raise
+            worker.release(reader, writer)
+            if status != 200:
+                raise UpstreamError(f"status {status}")
+            return body.decode("utf-8")
+
+        try:
+            return await asyncio.wait_for(_get(), IG_METRICS_SCRAPE_TIMEOUT)
+        except (UpstreamError, OSError, asyncio.TimeoutError, asyncio.IncompleteReadError, ValueError) as e:
+            logger.warning(f"Worker {worker.index} left out of /metrics: {e!r}")
+            return None
+
+    async def _send_metrics(self, send):
+        texts = await asyncio.gather(*(self._scrape(w) for w in self.workers))
+        raw = _merge_metrics({w.index: text for w, text in zip(self.workers, texts)}).encode("utf-8")
+        await send({
+            "type": "http.response.start",
+            "status": 200,
+            "headers": [(b"content-type", b"text/plain; version=0.0.4; charset=utf-8"), (b"content-length", str(len(raw)).encode())],
+        })
+        await send({"type": "http.response.body", "body": raw})
+
+    @staticmethod
+    async def _send_json(send, status: int, content: dict, extra_headers: list = ()):
+        raw = json.dumps(content, ensure_ascii=False).encode("utf-8")
+        await send({
+            "type": "http.response.start",
+            "status": status,
+            "headers": [(b"content-type", b"application/json"), (b"content-length", str(len(raw)).encode()), *extra_headers],
+        })
+        await send({"type": "http.response.body", "body": raw})
+
+    def health(self) -> dict:
+        workers = [w.describe() for w in self.workers]
+        return {
+            "status": "ok" if all(w["alive"] for w in workers) else "degraded",
+            "workers": workers,
+            "ring_replicas": sharding.IG_RING_REPLICAS,
+        }
+
+
+def main():
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s [%(levelname)s] %(message)s")
+    if sharding.IG_WORKERS <= 1:
+        os.execv(sys.executable, [sys.executable, "-m", "uvicorn", "main:app", "--app-dir", str(HERE),
+                                  "--host", HOST, "--port", str(PORT)])
+    import uvicorn
+
+    workers = [Worker(i, IG_WORKER_BASE_PORT + i) for i in range(sharding.IG_WORKERS)]
+    uvicorn.run(ClusterProxy(workers), host=HOST, port=PORT, lifespan="on",
+                timeout_keep_alive=_WORKER_KEEP_ALIVE, server_header=False, date_header=False)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,86 @@
+"""
+Single-flight coalescing for read endpoints: concurrent identical requests
+(same account, route and normalized params) share one upstream fetch.
+"""
+
+import asyncio
+import functools
+from typing import Callable, Optional
+
+from pydantic import BaseModel
+
+from execution import SharedBudget, current_budget, detached_task
+
+
+class SingleFlight:
+    """
+    Runs at most one call per key at a time; callers arriving while it runs
+    await the same result (or exception). The leader runs as its own task, so a
+    client disconnecting does not cancel the fetch for the others: its budget is
+    shared, lasting until the last caller's deadline or disconnect.
+    """
+
+    def __init__(self):
+        self._inflight: dict = {}
+        self.leaders = 0
+        self.coalesced = 0
+
+    async def do(self, key, factory: Callable):
+        flight = self._inflight.get(key)
+        if flight is None:
+            self.leaders += 1
+            budget = SharedBudget()
+            budget.add(current_budget())
+            task = detached_task(factory(), budget)
+            flight = self._inflight[key] = (task, budget)
+
+            def _forget(_t, key=key, flight=flight):
+                if self._inflight.get(key) is flight:
+                    del self._inflight[key]
+
+            task.add_done_callback(_forget)
+        else:
+            self.coalesced += 1
+            flight[1].add(current_budget())
+        return await asyncio.shield(flight[0])
+
+    def stats(self) -> dict:
+        total = self.leaders + self.coalesced
+        return {
+            "in_flight": len(self._inflight),
+            "leaders": self.leaders,
+            "coalesced": self.coalesced,
+            "coalesce_rate": round(self.coalesced / total, 4) if total else 0.0,
+        }
+
+
+def _normalize(value):
+    if isinstance(value, BaseModel):
+        return tuple(sorted((k, _normalize(v)) for k, v in value.model_dump().items()))
+    if isinstance(value, (list, tuple)):
+        return tuple(_normalize(v) for v in value)
+    return value
+
+
+def coalesced(flight: SingleFlight, normalize: Optional[dict] = None, skip: Optional[Callable] = None):
+    """
+    Decorator for FastAPI handlers. The key is (handler, every argument) with
+    normalize[name](value) applied first (e.g. strip "@" and lowercase usernames).
+    skip(kwargs) -> True bypasses coalescing (e.g. streaming responses).
+    """
+    normalize = normalize or {}
+
+    def decorator(handler):
+        @functools.wraps(handler)
+        async def wrapper(**kwargs):
+            if skip is not None and skip(kwargs):
+                return await handler(**kwargs)
+            key = (handler.__name__,) + tuple(
+                (name, _normalize(normalize[name](value) if name in normalize else value))
+                for name, value in sorted(kwargs.items())
+            )
+            return await flight.do(key, lambda: handler(**kwargs))
+
+        return wrapper
+
+    return decorator
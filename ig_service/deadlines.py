@@ -0,0 +1,128 @@
+"""
+Deadlines set by the caller, and client disconnects.
+
+The Node backend gives up on a request after its own HTTP timeout. It sends that
+limit as X-Request-Timeout (seconds from now) or X-Request-Deadline (Unix time, in
+seconds or milliseconds). DeadlineMiddleware turns it, minus IG_DEADLINE_MARGIN_MS
+to leave time to answer, into the request's execution Budget. Every
+_run_with_timeout call, pagination loop and chunk fetch of the request stays within
+that budget.
+
+The middleware also watches the connection. When the client disconnects before the
+response is complete the budget is cancelled, so queued calls are dropped and running
+ones stop at their next page or HTTP request.
+"""
+
+import asyncio
+import json
+import os
+import time
+from typing import Optional
+
+from execution import budget_scope
+from metrics import IG_ABANDONED_REQUESTS
+
+# Answer this long before the caller's deadline
+IG_DEADLINE_MARGIN_MS = int(os.environ.get("IG_DEADLINE_MARGIN_MS", "250"))
+
+
+def parse_deadline(headers) -> Optional[float]:
+    """Caller deadline from the ASGI headers as a time.monotonic() value, or None if absent or malformed."""
+    timeout = deadline = None
+    for name, value in headers:
+        if name == b"x-request-timeout":
+            timeout = value
+        elif name == b"x-request-deadline":
+            deadline = value
+    try:
+        if timeout is not None:
+            seconds = float(timeout)
+        elif deadline is not None:
+            at = float(deadline)
+            # Date.now() style milliseconds or Unix seconds
+            seconds = (at / 1000 if at > 1e11 else at) - time.time()
+        else:
+            return None
+    except ValueError:
+        return None
+    if seconds != seconds:
+        return None
+    return time.monotonic() + seconds - IG_DEADLINE_MARGIN_MS / 1000
+
+
+_EXPIRED_BODY = json.dumps({
+    "success": False,
+    "error": "La solicitud llegó después de su plazo límite.",
+}).encode("utf-8")
+
+
+class DeadlineMiddleware:
+    """ASGI middleware running each HTTP request under the caller's budget (see module docstring)."""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+        deadline = parse_deadline(scope.get("headers") or ())
+        if deadline is not None and deadline <= time.monotonic():
+            # Nobody is waiting for this answer any more
+            IG_ABANDONED_REQUESTS.inc(reason="expired")
+            await send({"type": "http.response.start", "status": 504, "headers": [
+                (b"content-type", b"application/json"), (b"content-length", str(len(_EXPIRED_BODY)).encode()),
+            ]})
+            await send({"type": "http.response.body", "body": _EXPIRED_BODY})
+            return
+        with budget_scope(deadline) as budget:
+            watch = _DisconnectWatch(receive, budget)
+            try:
+                await self.app(scope, watch.receive, watch.send(send))
+            finally:
+                watch.close()
+
+
+class _DisconnectWatch:
+    """
+    Reads the client's messages in the background so a disconnect is seen even while
+    the app is busy. Messages are handed to the app in order, and once the client is
+    gone the app gets http.disconnect as often as it asks.
+    """
+
+    def __init__(self, receive, budget):
+        self._receive = receive
+        self._budget = budget
+        self._messages: asyncio.Queue = asyncio.Queue()
+        self._disconnected = False
+        self._responded = False
+        self._pump = asyncio.ensure_future(self._read())
+
+    async def _read(self):
+        while True:
+            try:
+                message = await self._receive()
+            except Exception:
+                message = {"type": "http.disconnect"}
+            if message["type"] == "http.disconnect":
+                if not self._responded:
+                    self._budget.cancel()
+                    IG_ABANDONED_REQUESTS.inc(reason="disconnected")
+                self._disconnected = True
+                self._messages.put_nowait(message)
+                return
+            self._messages.put_nowait(message)
+
+    async def receive(self):
+        if self._disconnected and self._messages.empty():
+            return {"type": "http.disconnect"}
+        return await self._messages.get()
+
+    def send(self, send):
+        async def _send(message):
+            if message["type"] == "http.response.body" and not message.get("more_body", False):
+                self._responded = True
+            await send(message)
+        return _send
+
+    def close(self):
+        self._pump.cancel()
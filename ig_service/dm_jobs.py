@@ -0,0 +1,165 @@
+"""
+Persisted mass-DM jobs. Every recipient is checkpointed in SQLite before and
+after its send, so a job resumed after a restart never messages anyone twice:
+a recipient caught mid-send is marked "unknown" instead of being retried.
+"""
+
+import sqlite3
+import threading
+import time
+import uuid
+from pathlib import Path
+from typing import Optional
+
+# Job states
+QUEUED, RUNNING, DONE, FAILED, CANCELLED = "queued", "running", "done", "failed", "cancelled"
+ACTIVE_STATES = (QUEUED, RUNNING)
+
+# Recipient states
+PENDING, SENDING, SENT, ERROR, UNKNOWN, SKIPPED = "pending", "sending", "sent", "failed", "unknown", "skipped"
+
+
+def _now() -> str:
+    return time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime())
+
+
+class DMJobStore:
+    def __init__(self, path: Path):
+        self.path = path
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(str(path), check_same_thread=False, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS dm_jobs ("
+            " job_id TEXT PRIMARY KEY,"
+            " user_id TEXT NOT NULL,"
+            " message TEXT NOT NULL,"
+            " use_template INTEGER NOT NULL,"
+            " delay_s REAL NOT NULL,"
+            " status TEXT NOT NULL,"
+            " error TEXT,"
+            " created_at TEXT,"
+            " updated_at TEXT,"
+            " last_sent_at REAL)"
+        )
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS dm_job_recipients ("
+            " job_id TEXT NOT NULL,"
+            " idx INTEGER NOT NULL,"
+            " username TEXT NOT NULL,"
+            " status TEXT NOT NULL,"
+            " error TEXT,"
+            " updated_at TEXT,"
+            " PRIMARY KEY (job_id, idx))"
+        )
+
+    def create(self, user_id: str, message: str, use_template: bool, delay_s: float, usernames: list[str]) -> str:
+        job_id = uuid.uuid4().hex
+        now = _now()
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                self._conn.execute(
+                    "INSERT INTO dm_jobs (job_id, user_id, message, use_template, delay_s, status, created_at, updated_at)"
+                    " VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                    (job_id, user_id, message, int(use_template), delay_s, QUEUED, now, now),
+                )
+                self._conn.executemany(
+                    "INSERT INTO dm_job_recipients (job_id, idx, username, status, updated_at) VALUES (?, ?, ?, ?, ?)",
+                    [(job_id, i, u, PENDING, now) for i, u in enumerate(usernames)],
+                )
+                self._conn.execute("COMMIT")
+            except Exception:
+                self._conn.execute("ROLLBACK")
+                raise
+        return job_id
+
+    def get(self, job_id: str) -> Optional[dict]:
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT job_id, user_id, message, use_template, delay_s, status, error, created_at, updated_at, last_sent_at"
+                " FROM dm_jobs WHERE job_id = ?", (job_id,),
+            ).fetchone()
+            if row is None:
+                return None
+            recipients = self._conn.execute(
+                "SELECT idx, username, status, error, updated_at FROM dm_job_recipients WHERE job_id = ? ORDER BY idx",
+                (job_id,),
+            ).fetchall()
+        keys = ("job_id", "user_id", "message", "use_template", "delay_s", "status", "error",
+                "created_at", "updated_at", "last_sent_at")
+        job = dict(zip(keys, row))
+        job["use_template"] = bool(job["use_template"])
+        job["recipients"] = [
+            {"index": idx, "username": u, "status": st, "error": err, "updated_at": ts}
+            for idx, u, st, err, ts in recipients
+        ]
+        return job
+
+    def active_jobs(self) -> list[tuple[str, str]]:
+        """(job_id, user_id) of every queued or running job, oldest first."""
+        marks = ",".join("?" * len(ACTIVE_STATES))
+        with self._lock:
+            rows = self._conn.execute(
+                f"SELECT job_id, user_id FROM dm_jobs WHERE status IN ({marks}) ORDER BY created_at", ACTIVE_STATES
+            ).fetchall()
+        return [(r[0], r[1]) for r in rows]
+
+    def owner(self, job_id: str) -> Optional[str]:
+        """user_id of a job, used by the cluster proxy to route /dm/mass/{job_id}."""
+        with self._lock:
+            row = self._conn.execute("SELECT user_id FROM dm_jobs WHERE job_id = ?", (job_id,)).fetchone()
+        return row[0] if row else None
+
+    def set_status(self, job_id: str, status: str, error: Optional[str] = None):
+        with self._lock:
+            self._conn.execute(
+                "UPDATE dm_jobs SET status = ?, error = ?, updated_at = ? WHERE job_id = ?",
+                (status, error, _now(), job_id),
+            )
+
+    def mark_recipient(self, job_id: str, idx: int, status: str, error: Optional[str] = None):
+        now = _now()
+        with self._lock:
+            self._conn.execute(
+                "UPDATE dm_job_recipients SET status = ?, error = ?, updated_at = ? WHERE job_id = ? AND idx = ?",
+                (status, error, now, job_id, idx),
+            )
+            if status in (SENT, ERROR):
+                self._conn.execute(
+                    "UPDATE dm_jobs SET last_sent_at = ?, updated_at = ? WHERE job_id = ?", (time.time(), now, job_id)
+                )
+
+    def recover_interrupted(self, job_id: str) -> int:
+        """Recipients left in 'sending' by a crash may have received the DM: never retry them."""
+        with self._lock:
+            cur = self._conn.execute(
+                "UPDATE dm_job_recipients SET status = ?, error = ?, updated_at = ? WHERE job_id = ? AND status = ?",
+                (UNKNOWN, "Interrumpido durante el envío; no se reintenta para evitar duplicados.", _now(), job_id, SENDING),
+            )
+        return cur.rowcount
+
+    def skip_pending(self, job_id: str):
+        with self._lock:
+            self._conn.execute(
+                "UPDATE dm_job_recipients SET status = ?, updated_at = ? WHERE job_id = ? AND status = ?",
+                (SKIPPED, _now(), job_id, PENDING),
+            )
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+
+def summarize(job: dict) -> dict:
+    """Counts per recipient status plus the legacy sent / failed lists of the old synchronous response."""
+    counts: dict[str, int] = {}
+    sent, failed = [], []
+    for r in job["recipients"]:
+        counts[r["status"]] = counts.get(r["status"], 0) + 1
+        if r["status"] == SENT:
+            sent.append({"username": r["username"], "success": True})
+        elif r["status"] in (ERROR, UNKNOWN):
+            failed.append({"username": r["username"], "error": r["error"]})
+    return {"counts": counts, "sent": sent, "failed": failed, "total": len(job["recipients"])}
@@ -0,0 +1,423 @@
+"""
+Execution layer for blocking instagrapi work.
+Every handler in main.py runs its Instagram calls through here so a slow
+upstream call never blocks the event loop.
+
+Each call carries a Budget (its timeout, bounded by the request's own budget
+when there is one, see deadlines.py) in a context variable that is copied into
+the worker thread, so code running there can size request timeouts and stop
+paginating in time (see remaining / expired / deadline_sleep). A Python thread
+cannot be killed: when its caller times out or goes away the call's budget is
+cancelled, and it is counted as orphaned until it returns. New calls are refused
+while orphans hit the cap.
+"""
+
+import asyncio
+import concurrent.futures
+import contextlib
+import contextvars
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Optional
+
+from tracing import span
+
+# Dedicated pool for instagrapi calls (independent of asyncio's default pool)
+IG_WORKER_THREADS = int(os.environ.get("IG_WORKER_THREADS", "32"))
+# Timed-out calls still holding a worker thread before new calls are refused
+IG_MAX_ORPHANED_CALLS = int(os.environ.get("IG_MAX_ORPHANED_CALLS", str(max(1, IG_WORKER_THREADS // 2))))
+
+_executor = ThreadPoolExecutor(max_workers=IG_WORKER_THREADS, thread_name_prefix="ig-worker")
+_executor_lock = threading.Lock()
+_executor_counts = {"queued": 0, "running": 0, "orphaned": 0, "orphans_total": 0, "expired": 0, "rejected": 0}
+
+# Shared pool for GQL chunk fetches, and how many abandoned chunks may still be running
+IG_CHUNK_THREADS = int(os.environ.get("IG_CHUNK_THREADS", "8"))
+IG_MAX_ORPHANED_CHUNKS = int(os.environ.get("IG_MAX_ORPHANED_CHUNKS", "8"))
+
+
+# ─── Deadlines ────────────────────────────────────────────
+
+class Budget:
+    """
+    Time allowed for a request or call: an absolute time.monotonic() deadline (None
+    for no limit) that can also be cancelled early. It never outlasts its parent.
+    """
+
+    __slots__ = ("deadline", "parent", "cancelled")
+
+    def __init__(self, deadline: Optional[float], parent: Optional["Budget"] = None):
+        self.deadline = deadline
+        self.parent = parent
+        self.cancelled = False
+
+    def remaining(self) -> Optional[float]:
+        if self.cancelled:
+            return 0.0
+        left = None if self.deadline is None else self.deadline - time.monotonic()
+        if self.parent is not None:
+            outer = self.parent.remaining()
+            if outer is not None and (left is None or outer < left):
+                left = outer
+        return left
+
+    def cancel(self):
+        self.cancelled = True
+
+
+class SharedBudget:
+    """Budget of work shared by several requests (single-flight): it lasts as long as the longest-lived of them."""
+
+    __slots__ = ("members",)
+
+    def __init__(self):
+        self.members: list = []
+
+    def add(self, budget: Optional[Budget]):
+        self.members.append(budget)
+
+    def remaining(self) -> Optional[float]:
+        longest = 0.0
+        for budget in self.members:
+            left = budget.remaining() if budget is not None else None
+            if left is None:
+                return None
+            longest = max(longest, left)
+        return longest
+
+
+# Budget of the current call (worker threads) or request (event loop)
+_budget: contextvars.ContextVar[Optional[Budget]] = contextvars.ContextVar("ig_budget", default=None)
+# Chunk fetches abandoned by the running pool call (see ChunkPool.run and AccountLanes)
+_abandoned_chunks: contextvars.ContextVar[Optional[list]] = contextvars.ContextVar("ig_abandoned_chunks", default=None)
+
+
+def current_budget() -> Optional[Budget]:
+    return _budget.get()
+
+
+class DeadlineExceeded(TimeoutError):
+    """The call's deadline passed before (or while) its work could run."""
+
+
+class WorkerPoolSaturated(Exception):
+    """Raised instead of queueing a call while too many timed-out calls still hold worker threads."""
+
+
+def remaining(default: Optional[float] = None) -> Optional[float]:
+    """Seconds left in the current budget (0 once cancelled), or default when there is none."""
+    budget = _budget.get()
+    left = budget.remaining() if budget is not None else None
+    return default if left is None else left
+
+
+def expired() -> bool:
+    left = remaining()
+    return left is not None and left <= 0
+
+
+def detached_task(coro, budget=None) -> asyncio.Task:
+    """Run coro as a task under budget (None: unbounded) instead of the caller's, e.g. work that outlives the request."""
+    ctx = contextvars.copy_context()
+    ctx.run(_budget.set, budget)
+    return asyncio.get_running_loop().create_task(coro, context=ctx)
+
+
+@contextlib.contextmanager
+def budget_scope(deadline: Optional[float]):
+    """Run the enclosed code (e.g. one HTTP request) under a new Budget; calls made inside inherit it."""
+    budget = Budget(deadline, _budget.get())
+    token = _budget.set(budget)
+    try:
+        yield budget
+    finally:
+        _budget.reset(token)
+
+
+def deadline_sleep(seconds: float) -> bool:
+    """time.sleep for worker threads. Returns False at once, without sleeping, if the deadline would pass first."""
+    left = remaining()
+    if left is not None and left <= seconds:
+        return False
+    with span("sleep", seconds=seconds):
+        time.sleep(seconds)
+    return True
+
+
+# ─── Worker pool ──────────────────────────────────────────
+
+class _Tracked:
+    """
+    Callable for the worker pool: runs func in a copy of the caller's context with
+    the call's budget set, and keeps the counts reported by executor_stats().
+    """
+
+    __slots__ = ("func", "args", "budget", "ctx", "submitted", "started", "finished", "orphaned", "chunks")
+
+    def __init__(self, func, *args, budget: Budget):
+        self.func = func
+        self.args = args
+        self.budget = budget
+        self.ctx = contextvars.copy_context()
+        self.submitted = False
+        self.started = False
+        self.finished = False
+        self.orphaned = False
+        # Futures of chunk fetches this call abandoned, still running on the Client
+        self.chunks: list = []
+
+    def submit(self, loop) -> asyncio.Future:
+        with _executor_lock:
+            self.submitted = True
+            _executor_counts["queued"] += 1
+        return loop.run_in_executor(_executor, self)
+
+    def __call__(self):
+        with _executor_lock:
+            if self.started:
+                return None
+            self.started = True
+            _executor_counts["queued"] -= 1
+            left = self.budget.remaining()
+            if left is not None and left <= 0:
+                # Waited in the queue past its deadline, or its caller is gone
+                _executor_counts["expired"] += 1
+                self.finished = True
+                raise DeadlineExceeded("deadline passed while queued")
+            _executor_counts["running"] += 1
+        try:
+            return self.ctx.run(self._run)
+        finally:
+            with _executor_lock:
+                self.finished = True
+                _executor_counts["running"] -= 1
+                if self.orphaned:
+                    _executor_counts["orphaned"] -= 1
+
+    def _run(self):
+        _budget.set(self.budget)
+        _abandoned_chunks.set(self.chunks)
+        return self.func(*self.args)
+
+    def give_up(self) -> bool:
+        """
+        The caller stopped waiting (timeout or cancellation). A call that has not
+        started is dropped; a running one sees its budget cancelled (so it stops at
+        the next page or request) and is counted as orphaned until it returns.
+        Returns True if func never ran.
+        """
+        self.budget.cancel()
+        with _executor_lock:
+            if not self.started:
+                self.started = True
+                if self.submitted:
+                    _executor_counts["queued"] -= 1
+                return True
+            if not self.finished and not self.orphaned:
+                self.orphaned = True
+                _executor_counts["orphaned"] += 1
+                _executor_counts["orphans_total"] += 1
+            return False
+
+
+def executor_stats() -> dict:
+    return {"max_workers": IG_WORKER_THREADS, "max_orphaned": IG_MAX_ORPHANED_CALLS, **_executor_counts}
+
+
+def _consume(fut: asyncio.Future):
+    # Results of abandoned calls are never awaited: keep asyncio from logging their errors
+    if not fut.cancelled():
+        fut.exception()
+
+
+class _Lane:
+    __slots__ = ("lock", "waiting", "running")
+
+    def __init__(self):
+        self.lock = asyncio.Lock()
+        self.waiting = 0
+        self.running = False
+
+    @property
+    def depth(self) -> int:
+        return self.waiting + (1 if self.running else 0)
+
+
+class AccountLanes:
+    """
+    Per-account serialized execution. An instagrapi Client is not thread-safe
+    (shared requests session, last_json, cookies), so calls for one account run
+    strictly in FIFO order while different accounts run in parallel on the pool.
+
+    A lane stays busy until its worker thread actually returns, even when the
+    awaiting caller already gave up on a timeout, so a timed-out call can never
+    overlap with the next one on the same Client. The same goes for chunk fetches
+    the call abandoned on the chunk pool: they still use the Client, so the lane
+    is only released once they have finished too.
+    """
+
+    def __init__(self):
+        self._lanes: dict[str, _Lane] = {}
+
+    async def run(self, key: str, call: _Tracked):
+        lane = self._lanes.get(key)
+        if lane is None:
+            lane = self._lanes[key] = _Lane()
+        lane.waiting += 1
+        try:
+            await lane.lock.acquire()
+        finally:
+            lane.waiting -= 1
+            if not lane.lock.locked():
+                self._discard_if_idle(key, lane)
+        lane.running = True
+        loop = asyncio.get_running_loop()
+        fut = call.submit(loop)
+
+        def _unlock():
+            lane.running = False
+            lane.lock.release()
+            self._discard_if_idle(key, lane)
+
+        def _release(f):
+            _consume(f)
+            pending = [c for c in call.chunks if not c.done()]
+            if not pending:
+                _unlock()
+                return
+            left = [len(pending)]
+
+            def _chunk_done(_):
+                left[0] -= 1
+                if left[0] == 0:
+                    loop.call_soon_threadsafe(_unlock)
+
+            for chunk in pending:
+                chunk.add_done_callback(_chunk_done)
+
+        fut.add_done_callback(_release)
+        return await asyncio.shield(fut)
+
+    def _discard_if_idle(self, key: str, lane: _Lane):
+        if lane.depth == 0 and not lane.lock.locked() and self._lanes.get(key) is lane:
+            del self._lanes[key]
+
+    def depth(self, key: str) -> int:
+        lane = self._lanes.get(key)
+        return lane.depth if lane else 0
+
+    def depths(self) -> dict[str, int]:
+        """Queued + running calls per account with pending work."""
+        return {key: lane.depth for key, lane in self._lanes.items() if lane.depth}
+
+
+lanes = AccountLanes()
+
+
+async def run_blocking(func, *args, timeout_seconds: float, lane: Optional[str] = None):
+    """
+    Run a blocking callable on the instagrapi pool, bounded by timeout_seconds
+    and by the current request's budget. With lane set, the call is serialized
+    behind other calls for that account; time spent queued counts against the
+    timeout. A timeout before func started raises DeadlineExceeded, so callers
+    can tell "never ran" (safe to retry) from a plain TimeoutError (may have run).
+    """
+    budget = Budget(time.monotonic() + timeout_seconds, _budget.get())
+    left = budget.remaining()
+    with _executor_lock:
+        if left <= 0:
+            _executor_counts["expired"] += 1
+            raise DeadlineExceeded("no time left in the request budget")
+        if _executor_counts["orphaned"] >= IG_MAX_ORPHANED_CALLS:
+            _executor_counts["rejected"] += 1
+            raise WorkerPoolSaturated(f"{_executor_counts['orphaned']} timed-out calls still hold worker threads")
+    call = _Tracked(func, *args, budget=budget)
+    try:
+        if lane is not None:
+            return await asyncio.wait_for(lanes.run(lane, call), timeout=left)
+        fut = call.submit(asyncio.get_running_loop())
+        fut.add_done_callback(_consume)
+        return await asyncio.wait_for(fut, timeout=left)
+    except asyncio.TimeoutError:
+        if call.give_up():
+            raise DeadlineExceeded(f"timed out after {timeout_seconds:g}s before the call started") from None
+        raise
+    except asyncio.CancelledError:
+        call.give_up()
+        raise
+
+
+class ChunkPoolSaturated(Exception):
+    """Raised instead of queueing a chunk fetch while too many abandoned fetches still run."""
+
+
+class ChunkPool:
+    """
+    Shared pool for single-chunk fetches with a real per-chunk deadline, never
+    later than the calling worker's own budget. On timeout the caller returns
+    immediately: a not-yet-started fetch is cancelled, a running one is abandoned
+    and counted as orphaned until its thread finishes. New fetches are refused
+    while orphans hit the cap, so stuck Instagram calls cannot pile up threads.
+    """
+
+    def __init__(self, max_workers: int, max_orphaned: int):
+        self.max_workers = max_workers
+        self.max_orphaned = max_orphaned
+        self._pool = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="ig-chunk")
+        self._lock = threading.Lock()
+        self.in_flight = 0
+        self.orphaned = 0
+        self.timeouts = 0
+        self.rejected = 0
+
+    def run(self, func, *args, timeout: float):
+        timeout = min(timeout, remaining(timeout))
+        if timeout <= 0:
+            with self._lock:
+                self.timeouts += 1
+            raise DeadlineExceeded("no time left for another chunk")
+        with self._lock:
+            if self.orphaned >= self.max_orphaned:
+                self.rejected += 1
+                raise ChunkPoolSaturated(f"{self.orphaned} chunk fetches still stuck past their deadline")
+            self.in_flight += 1
+        state = {"orphaned": False}
+
+        def _done(_):
+            with self._lock:
+                self.in_flight -= 1
+                if state["orphaned"]:
+                    self.orphaned -= 1
+
+        fut = self._pool.submit(contextvars.copy_context().run, func, *args)
+        fut.add_done_callback(_done)
+        try:
+            return fut.result(timeout=timeout)
+        except concurrent.futures.TimeoutError:
+            if not fut.cancel():
+                with self._lock:
+                    if not fut.done():
+                        state["orphaned"] = True
+                        self.orphaned += 1
+                # Keeps the account lane busy until the fetch really ends
+                abandoned = _abandoned_chunks.get()
+                if abandoned is not None:
+                    abandoned.append(fut)
+            with self._lock:
+                self.timeouts += 1
+            raise
+
+    def stats(self) -> dict:
+        return {
+            "max_workers": self.max_workers,
+            "in_flight": self.in_flight,
+            "orphaned": self.orphaned,
+            "max_orphaned": self.max_orphaned,
+            "timeouts": self.timeouts,
+            "rejected": self.rejected,
+        }
+
+
+chunk_pool = ChunkPool(IG_CHUNK_THREADS, IG_MAX_ORPHANED_CHUNKS)
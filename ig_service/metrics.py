@@ -0,0 +1,189 @@
+"""
+Minimal Prometheus text-format metrics for ig_service (no client library needed).
+Service metrics are defined at the bottom and rendered by GET /metrics.
+"""
+
+import threading
+import time
+from typing import Callable, Iterable, Optional
+
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120)
+
+
+def _escape(value) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _fmt_labels(names: tuple, values: tuple, extra: str = "") -> str:
+    parts = [f'{n}="{_escape(v)}"' for n, v in zip(names, values)]
+    if extra:
+        parts.append(extra)
+    return "{" + ",".join(parts) + "}" if parts else ""
+
+
+def _fmt_value(v: float) -> str:
+    if v == float("inf"):
+        return "+Inf"
+    return repr(float(v)) if isinstance(v, float) else str(v)
+
+
+class _Metric:
+    type = "untyped"
+
+    def __init__(self, name: str, documentation: str, labelnames: Iterable[str] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._lock = threading.Lock()
+
+    def _key(self, labels: dict) -> tuple:
+        return tuple(str(labels.get(n, "")) for n in self.labelnames)
+
+    def header(self) -> list[str]:
+        return [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.type}"]
+
+
+class Counter(_Metric):
+    type = "counter"
+
+    def __init__(self, name, documentation, labelnames=()):
+        super().__init__(name, documentation, labelnames)
+        self._values: dict[tuple, float] = {}
+
+    def inc(self, amount: float = 1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def render(self) -> list[str]:
+        with self._lock:
+            items = list(self._values.items())
+        return self.header() + [
+            f"{self.name}{_fmt_labels(self.labelnames, k)} {_fmt_value(v)}" for k, v in items
+        ]
+
+
+class Gauge(_Metric):
+    """Gauge whose samples come from a callback at scrape time: fn() -> number or [(labels, value)]."""
+
+    type = "gauge"
+
+    def __init__(self, name, documentation, labelnames=(), fn: Optional[Callable] = None):
+        super().__init__(name, documentation, labelnames)
+        self.fn = fn
+
+    def render(self) -> list[str]:
+        samples = self.fn() if self.fn else []
+        if not isinstance(samples, (list, tuple)):
+            samples = [({}, samples)]
+        return self.header() + [
+            f"{self.name}{_fmt_labels(self.labelnames, self._key(labels))} {_fmt_value(v)}"
+            for labels, v in samples
+        ]
+
+
+class Histogram(_Metric):
+    type = "histogram"
+
+    def __init__(self, name, documentation, labelnames=(), buckets=DEFAULT_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets)) + (float("inf"),)
+        self._values: dict[tuple, list] = {}
+
+    def observe(self, value: float, **labels):
+        key = self._key(labels)
+        with self._lock:
+            entry = self._values.get(key)
+            if entry is None:
+                entry = self._values[key] = [[0] * len(self.buckets), 0.0, 0]
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    entry[0][i] += 1
+                    break
+            entry[1] += value
+            entry[2] += 1
+
+    def render(self) -> list[str]:
+        with self._lock:
+            items = [(k, (list(v[0]), v[1], v[2])) for k, v in self._values.items()]
+        lines = self.header()
+        for key, (counts, total, count) in items:
+            cumulative = 0
+            for bound, c in zip(self.buckets, counts):
+                cumulative += c
+                le = 'le="%s"' % _fmt_value(bound if bound == float("inf") else float(bound))
+                lines.append(f"{self.name}_bucket{_fmt_labels(self.labelnames, key, le)} {cumulative}")
+            lines.append(f"{self.name}_sum{_fmt_labels(self.labelnames, key)} {_fmt_value(total)}")
+            lines.append(f"{self.name}_count{_fmt_labels(self.labelnames, key)} {count}")
+        return lines
+
+
+class Registry:
+    def __init__(self):
+        self._metrics: list[_Metric] = []
+
+    def register(self, metric: _Metric) -> _Metric:
+        self._metrics.append(metric)
+        return metric
+
+    def render(self) -> str:
+        lines = []
+        for metric in self._metrics:
+            try:
+                lines.extend(metric.render())
+            except Exception as e:
+                lines.append(f"# {metric.name} collection failed: {_escape(e)}")
+        return "\n".join(lines) + "\n"
+
+
+class HTTPMetricsMiddleware:
+    """ASGI middleware recording request count and latency per route template."""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+        start = time.perf_counter()
+        status = {"code": 500}
+
+        async def _send(message):
+            if message["type"] == "http.response.start":
+                status["code"] = message["status"]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, _send)
+        finally:
+            route = getattr(scope.get("route"), "path", None) or "unmatched"
+            method = scope.get("method", "")
+            HTTP_REQUESTS.inc(route=route, method=method, status=status["code"])
+            HTTP_LATENCY.observe(time.perf_counter() - start, route=route, method=method)
+
+
+# ─── ig_service metrics ───────────────────────────────────
+
+REGISTRY = Registry()
+
+HTTP_REQUESTS = REGISTRY.register(Counter(
+    "ig_http_requests_total", "HTTP requests by route template, method and status.", ("route", "method", "status")))
+HTTP_LATENCY = REGISTRY.register(Histogram(
+    "ig_http_request_duration_seconds", "HTTP request latency (until the response body is complete).", ("route", "method")))
+IG_CALLS = REGISTRY.register(Counter(
+    "ig_calls_total", "Blocking instagrapi calls by function and outcome (ok, timeout, deadline, cancelled or exception type).", ("method", "outcome")))
+IG_CALL_LATENCY = REGISTRY.register(Histogram(
+    "ig_call_duration_seconds", "Latency of blocking instagrapi calls, including time queued in the account lane (cancelled calls excluded).", ("method",)))
+IG_UPSTREAM_ERRORS = REGISTRY.register(Counter(
+    "ig_upstream_errors_total", "Instagram errors classified by _handle_ig_error.", ("kind",)))
+IG_SLOW_REQUESTS = REGISTRY.register(Counter(
+    "ig_slow_requests_total", "Requests slower than IG_SLOW_REQUEST_MS (logged with their spans, see tracing.py).", ("route",)))
+IG_ABANDONED_REQUESTS = REGISTRY.register(Counter(
+    "ig_abandoned_requests_total", "Requests the caller gave up on: past their deadline on arrival, or client disconnected.", ("reason",)))
+IG_BREAKER_TRIPS = REGISTRY.register(Counter(
+    "ig_breaker_trips_total", "Per-account circuit breaker trips by error kind.", ("kind",)))
+IG_BREAKER_REJECTED = REGISTRY.register(Counter(
+    "ig_breaker_rejected_total", "Calls failed fast by an open per-account circuit breaker.", ("kind",)))
+SESSION_STORE_LATENCY = REGISTRY.register(Histogram(
+    "ig_session_store_duration_seconds", "Session store latency by operation.", ("op",),
+    buckets=(0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 1)))
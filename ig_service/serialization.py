@@ -0,0 +1,150 @@
+"""
+Hot-path formatting and JSON encoding for list endpoints.
+
+Formatters are compiled once per model class and read pydantic fields straight
+from the instance __dict__: no getattr calls and no failing attribute lookups
+(UserShort has no is_verified, for instance). format_user_raw formats the
+private API's user dicts directly, skipping the pydantic models.
+Responses use orjson when it is installed and the stdlib encoder otherwise.
+"""
+
+import json
+from typing import Any, Callable
+
+from starlette.responses import JSONResponse
+
+from tracing import span
+
+try:
+    import orjson
+except ImportError:  # optional speed-up
+    orjson = None
+
+
+class FastJSONResponse(JSONResponse):
+    """
+    JSONResponse rendered with orjson when available. Returning one from a handler
+    also skips FastAPI's jsonable_encoder pass, so content must already be plain
+    JSON types (dicts, lists, str, int, float, bool, None).
+    """
+
+    def render(self, content: Any) -> bytes:
+        with span("format.json"):
+            if orjson is not None:
+                return orjson.dumps(content)
+            return json.dumps(content, ensure_ascii=False, allow_nan=False, indent=None, separators=(",", ":")).encode("utf-8")
+
+
+def ndjson_line(obj) -> bytes:
+    if orjson is not None:
+        return orjson.dumps(obj) + b"\n"
+    return (json.dumps(obj, ensure_ascii=False) + "\n").encode("utf-8")
+
+
+# ─── Users ────────────────────────────────────────────────
+
+def _format_user_generic(u) -> dict:
+    return {
+        "pk": str(u.pk),
+        "username": getattr(u, "username", "") or "",
+        "full_name": getattr(u, "full_name", "") or "",
+        "is_private": getattr(u, "is_private", False),
+        "is_verified": getattr(u, "is_verified", False),
+        "profile_pic_url": str(u.profile_pic_url) if getattr(u, "profile_pic_url", None) else None,
+        "follower_count": getattr(u, "follower_count", None),
+        "following_count": getattr(u, "following_count", None),
+        "media_count": getattr(u, "media_count", None),
+        "is_business": getattr(u, "is_business_account", False) or getattr(u, "is_business", False),
+    }
+
+
+def _compile_user_formatter(cls) -> Callable[[Any], dict]:
+    fields = getattr(cls, "model_fields", None)
+    if fields is None:
+        return _format_user_generic
+    business_key = next((k for k in ("is_business_account", "is_business") if k in fields), None)
+
+    def _format(u) -> dict:
+        d = u.__dict__
+        pic = d.get("profile_pic_url")
+        return {
+            "pk": str(d["pk"]),
+            "username": d.get("username") or "",
+            "full_name": d.get("full_name") or "",
+            "is_private": d.get("is_private", False),
+            "is_verified": d.get("is_verified", False),
+            "profile_pic_url": str(pic) if pic else None,
+            "follower_count": d.get("follower_count"),
+            "following_count": d.get("following_count"),
+            "media_count": d.get("media_count"),
+            "is_business": d[business_key] if business_key else False,
+        }
+
+    return _format
+
+
+_user_formatters: dict[type, Callable[[Any], dict]] = {}
+
+
+def format_user(u) -> dict:
+    fmt = _user_formatters.get(type(u))
+    if fmt is None:
+        fmt = _user_formatters[type(u)] = _compile_user_formatter(type(u))
+    return fmt(u)
+
+
+def format_user_raw(d: dict) -> dict:
+    """Same output as format_user, from a private API user dict (friendships, likers...)."""
+    return {
+        "pk": str(d.get("pk") or d.get("pk_id") or d.get("id")),
+        "username": d.get("username") or "",
+        "full_name": d.get("full_name") or "",
+        "is_private": d.get("is_private", False),
+        "is_verified": d.get("is_verified", False),
+        "profile_pic_url": d.get("profile_pic_url") or None,
+        "follower_count": d.get("follower_count"),
+        "following_count": d.get("following_count"),
+        "media_count": d.get("media_count"),
+        "is_business": d.get("is_business_account", False) or d.get("is_business", False),
+    }
+
+
+def format_users(items) -> list[dict]:
+    """Format a list mixing raw dicts and instagrapi user models."""
+    return [format_user_raw(u) if isinstance(u, dict) else format_user(u) for u in items]
+
+
+# ─── Media ────────────────────────────────────────────────
+
+def format_media(m) -> dict:
+    d = m.__dict__
+    image_url = d.get("thumbnail_url")
+    if image_url:
+        image_url = str(image_url)
+    else:
+        resources = d.get("resources")
+        first = resources[0].thumbnail_url if resources else None
+        image_url = str(first) if first else None
+    code = d.get("code")
+    taken_at = d.get("taken_at")
+    user = d.get("user")
+    if user:
+        ud = user.__dict__
+        user = {
+            "pk": str(ud["pk"]),
+            "username": ud.get("username"),
+            "full_name": ud.get("full_name") or "",
+            "is_verified": ud.get("is_verified", False),
+        }
+    return {
+        "pk": str(d["pk"]),
+        "shortcode": code,
+        "media_type": d.get("media_type"),
+        "caption": d.get("caption_text") or "",
+        "like_count": d.get("like_count") or 0,
+        "comment_count": d.get("comment_count") or 0,
+        "taken_at": taken_at.isoformat() if taken_at else None,
+        "permalink": f"https://www.instagram.com/p/{code}/" if code else None,
+        "image_url": image_url,
+        "user": user,
+    }
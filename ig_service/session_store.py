@@ -0,0 +1,409 @@
+"""
+Persistent storage for instagrapi sessions.
+
+SQLite in WAL mode is the default backend (IG_SESSION_STORE=sqlite); the legacy
+one-JSON-file-per-account layout is kept as IG_SESSION_STORE=file, now with
+atomic renames. Writes are write-behind: save() only records the latest payload
+per account and a writer thread commits pending saves in batched transactions.
+Saves whose content did not change since the last write are debounced.
+
+Pending 2FA / challenge state is persisted next to the sessions (written
+through, it is rare) so a login started on one worker can be finished on
+another after a restart or a rebalance.
+"""
+
+import hashlib
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+from pathlib import Path
+from typing import Optional
+
+logger = logging.getLogger("ig_service")
+
+_DELETE = object()
+
+
+class SQLiteBackend:
+    """All sessions in one SQLite file; each batch is a single atomic transaction."""
+
+    def __init__(self, path: Path, legacy_dir: Optional[Path] = None):
+        self.path = path
+        self.legacy_dir = legacy_dir
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(str(path), check_same_thread=False, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS sessions ("
+            " user_id TEXT PRIMARY KEY,"
+            " username TEXT,"
+            " data TEXT NOT NULL,"
+            " digest TEXT,"
+            " saved_at TEXT)"
+        )
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS pending_auth ("
+            " kind TEXT NOT NULL,"
+            " user_id TEXT NOT NULL,"
+            " data TEXT NOT NULL,"
+            " expires_at REAL NOT NULL,"
+            " PRIMARY KEY (kind, user_id))"
+        )
+        if legacy_dir is not None:
+            self._import_legacy(legacy_dir)
+
+    def _import_legacy(self, legacy_dir: Path):
+        """
+        One-time import of {user_id}_py.json files written by older versions.
+        Imported files are renamed to *_py.json.imported so a later logout is
+        not undone by importing them again on the next start.
+        """
+        files = list(legacy_dir.glob("*_py.json"))
+        if not files:
+            return
+        with self._lock:
+            known = {row[0] for row in self._conn.execute("SELECT user_id FROM sessions")}
+        batch = {}
+        done = []
+        for f in files:
+            user_id = f.name[: -len("_py.json")]
+            if user_id in known:
+                done.append(f)
+                continue
+            try:
+                raw = f.read_text(encoding="utf-8")
+                data = json.loads(raw)
+            except Exception as e:
+                logger.warning(f"Skipping unreadable legacy session {f.name}: {e}")
+                continue
+            batch[user_id] = (raw, None, data.get("username"), data.get("savedAt"))
+            done.append(f)
+        if batch:
+            self.write_batch(batch)
+            logger.info(f"Imported {len(batch)} legacy session files into {self.path.name}")
+        for f in done:
+            try:
+                f.replace(f.with_name(f.name + ".imported"))
+            except OSError as e:
+                # Another worker importing at the same time may have renamed it already
+                if f.exists():
+                    logger.warning(f"Could not rename imported legacy session {f.name}: {e}")
+
+    def _remove_legacy(self, user_id: str):
+        if self.legacy_dir is None:
+            return
+        for name in (f"{user_id}_py.json", f"{user_id}_py.json.imported"):
+            (self.legacy_dir / name).unlink(missing_ok=True)
+
+    def read(self, user_id: str) -> Optional[str]:
+        with self._lock:
+            row = self._conn.execute("SELECT data FROM sessions WHERE user_id = ?", (user_id,)).fetchone()
+        return row[0] if row else None
+
+    def list_user_ids(self) -> list[str]:
+        with self._lock:
+            return [row[0] for row in self._conn.execute("SELECT user_id FROM sessions")]
+
+    def write_batch(self, batch: dict):
+        """batch: user_id -> (json, digest, username, saved_at) or _DELETE."""
+        upserts = [(uid, v[2], v[0], v[1], v[3]) for uid, v in batch.items() if v is not _DELETE]
+        deletes = [(uid,) for uid, v in batch.items() if v is _DELETE]
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                if upserts:
+                    self._conn.executemany(
+                        "INSERT INTO sessions (user_id, username, data, digest, saved_at) VALUES (?, ?, ?, ?, ?)"
+                        " ON CONFLICT(user_id) DO UPDATE SET username = excluded.username, data = excluded.data,"
+                        " digest = excluded.digest, saved_at = excluded.saved_at",
+                        upserts,
+                    )
+                if deletes:
+                    self._conn.executemany("DELETE FROM sessions WHERE user_id = ?", deletes)
+                self._conn.execute("COMMIT")
+            except Exception:
+                self._conn.execute("ROLLBACK")
+                raise
+        # A logged-out account's legacy file would otherwise still hold its session and password
+        for (uid,) in deletes:
+            self._remove_legacy(uid)
+
+    def read_pending(self, kind: str, user_id: str) -> Optional[tuple[str, float]]:
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT data, expires_at FROM pending_auth WHERE kind = ? AND user_id = ?", (kind, user_id)
+            ).fetchone()
+        return (row[0], row[1]) if row else None
+
+    def write_pending(self, kind: str, user_id: str, data: Optional[str], expires_at: float = 0.0):
+        """Upsert one entry, or delete it when data is None."""
+        with self._lock:
+            if data is None:
+                self._conn.execute("DELETE FROM pending_auth WHERE kind = ? AND user_id = ?", (kind, user_id))
+            else:
+                self._conn.execute(
+                    "INSERT INTO pending_auth (kind, user_id, data, expires_at) VALUES (?, ?, ?, ?)"
+                    " ON CONFLICT(kind, user_id) DO UPDATE SET data = excluded.data, expires_at = excluded.expires_at",
+                    (kind, user_id, data, expires_at),
+                )
+
+    def purge_pending(self, now: float) -> int:
+        with self._lock:
+            return self._conn.execute("DELETE FROM pending_auth WHERE expires_at <= ?", (now,)).rowcount
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+
+class FileBackend:
+    """Legacy layout: one {user_id}_py.json per account, written via temp file + rename."""
+
+    def __init__(self, directory: Path):
+        self.directory = directory
+
+    def _file(self, user_id: str) -> Path:
+        return self.directory / f"{user_id}_py.json"
+
+    def read(self, user_id: str) -> Optional[str]:
+        f = self._file(user_id)
+        return f.read_text(encoding="utf-8") if f.exists() else None
+
+    def list_user_ids(self) -> list[str]:
+        return [f.name[: -len("_py.json")] for f in self.directory.glob("*_py.json")]
+
+    def write_batch(self, batch: dict):
+        for uid, v in batch.items():
+            f = self._file(uid)
+            if v is _DELETE:
+                f.unlink(missing_ok=True)
+                continue
+            tmp = f.with_suffix(".json.tmp")
+            with open(tmp, "w", encoding="utf-8") as fh:
+                fh.write(v[0])
+                fh.flush()
+                os.fsync(fh.fileno())
+            os.replace(tmp, f)
+
+    def _pending_file(self, kind: str, user_id: str) -> Path:
+        return self.directory / f"{user_id}_{kind}.pending.json"
+
+    def read_pending(self, kind: str, user_id: str) -> Optional[tuple[str, float]]:
+        f = self._pending_file(kind, user_id)
+        if not f.exists():
+            return None
+        entry = json.loads(f.read_text(encoding="utf-8"))
+        return entry["data"], entry["expires_at"]
+
+    def write_pending(self, kind: str, user_id: str, data: Optional[str], expires_at: float = 0.0):
+        f = self._pending_file(kind, user_id)
+        if data is None:
+            f.unlink(missing_ok=True)
+            return
+        tmp = f.with_suffix(".tmp")
+        tmp.write_text(json.dumps({"data": data, "expires_at": expires_at}), encoding="utf-8")
+        os.replace(tmp, f)
+
+    def purge_pending(self, now: float) -> int:
+        purged = 0
+        for f in self.directory.glob("*.pending.json"):
+            try:
+                if json.loads(f.read_text(encoding="utf-8"))["expires_at"] <= now:
+                    f.unlink(missing_ok=True)
+                    purged += 1
+            except Exception:
+                continue
+        return purged
+
+    def close(self):
+        pass
+
+
+class SessionStore:
+    """
+    Write-behind session store. save() and delete() never touch disk on the
+    caller's thread; reads see pending writes first, so callers always read
+    their own writes.
+    """
+
+    def __init__(self, backend, flush_interval: float = 0.5):
+        self.backend = backend
+        self.flush_interval = flush_interval
+        # Optional observe(op, seconds) hook for backend latency ("read" / "write")
+        self.observe = None
+        self._pending: dict = {}
+        self._digests: dict[str, str] = {}
+        self._lock = threading.Lock()
+        self._write_lock = threading.Lock()
+        self._wake = threading.Event()
+        self._closed = False
+        self.saves = 0
+        self.debounced = 0
+        self.batches = 0
+        self.rows_written = 0
+        self.last_batch_ms = 0.0
+        self._thread = threading.Thread(target=self._writer, name="ig-session-writer", daemon=True)
+        self._thread.start()
+
+    def save(self, user_id: str, data: dict):
+        """Queue a session payload ({username, password, session, savedAt})."""
+        content = json.dumps(
+            {k: v for k, v in data.items() if k != "savedAt"}, default=str, sort_keys=True
+        )
+        digest = hashlib.sha1(content.encode("utf-8")).hexdigest()
+        with self._lock:
+            self.saves += 1
+            if self._digests.get(user_id) == digest:
+                self.debounced += 1
+                return False
+            self._digests[user_id] = digest
+            self._pending[user_id] = (
+                json.dumps(data, default=str), digest, data.get("username"), data.get("savedAt"),
+            )
+        self._wake.set()
+        return True
+
+    def delete(self, user_id: str):
+        """Queue removal of the account's session, legacy JSON files included."""
+        with self._lock:
+            self._digests.pop(user_id, None)
+            self._pending[user_id] = _DELETE
+        self._wake.set()
+
+    def load(self, user_id: str) -> Optional[dict]:
+        with self._lock:
+            pending = self._pending.get(user_id)
+        if pending is _DELETE:
+            return None
+        if pending:
+            raw = pending[0]
+        else:
+            t0 = time.perf_counter()
+            raw = self.backend.read(user_id)
+            self._observe("read", t0)
+        if raw is None:
+            return None
+        try:
+            return json.loads(raw)
+        except Exception as e:
+            logger.warning(f"Corrupt session for userId={user_id}: {e}")
+            return None
+
+    def list_user_ids(self) -> list[str]:
+        ids = set(self.backend.list_user_ids())
+        with self._lock:
+            for uid, v in self._pending.items():
+                if v is _DELETE:
+                    ids.discard(uid)
+                else:
+                    ids.add(uid)
+        return sorted(ids)
+
+    def flush(self):
+        """Write every pending change now (blocking)."""
+        with self._write_lock:
+            with self._lock:
+                batch, self._pending = self._pending, {}
+            if not batch:
+                return
+            t0 = time.perf_counter()
+            try:
+                self.backend.write_batch(batch)
+            except Exception as e:
+                logger.error(f"Session store write failed ({len(batch)} rows): {e}")
+                with self._lock:
+                    for uid, v in batch.items():
+                        self._pending.setdefault(uid, v)
+                return
+            self.last_batch_ms = (time.perf_counter() - t0) * 1000
+            self._observe("write", t0)
+            self.batches += 1
+            self.rows_written += len(batch)
+
+    def _observe(self, op: str, t0: float):
+        if self.observe is not None:
+            self.observe(op, time.perf_counter() - t0)
+
+    def _writer(self):
+        while not self._closed:
+            self._wake.wait()
+            # Let a burst of saves coalesce into one transaction
+            time.sleep(self.flush_interval)
+            self._wake.clear()
+            self.flush()
+
+    def close(self):
+        self._closed = True
+        self._wake.set()
+        self.flush()
+        self.backend.close()
+
+    def pending(self, kind: str) -> "PendingState":
+        return PendingState(self.backend, kind)
+
+    def purge_pending(self) -> int:
+        """Drop expired pending-auth entries of every kind."""
+        return self.backend.purge_pending(time.time())
+
+    def stats(self) -> dict:
+        return {
+            "backend": type(self.backend).__name__,
+            "pending": len(self._pending),
+            "saves": self.saves,
+            "debounced": self.debounced,
+            "batches": self.batches,
+            "rows_written": self.rows_written,
+            "last_batch_ms": round(self.last_batch_ms, 2),
+        }
+
+
+class PendingState:
+    """
+    Persisted pending-auth entries of one kind ("2fa", "challenge"), keyed by
+    user_id. Used as the backing of an ExpiringDict; expiry is wall-clock here
+    because it has to survive a restart.
+    """
+
+    def __init__(self, backend, kind: str):
+        self.backend = backend
+        self.kind = kind
+
+    def load(self, user_id: str) -> Optional[tuple[dict, float]]:
+        """(value, seconds left), or None when missing or expired."""
+        try:
+            entry = self.backend.read_pending(self.kind, user_id)
+        except Exception as e:
+            logger.warning(f"Could not read pending {self.kind} for userId={user_id}: {e}")
+            return None
+        if entry is None:
+            return None
+        left = entry[1] - time.time()
+        if left <= 0:
+            self.delete(user_id)
+            return None
+        return json.loads(entry[0]), left
+
+    def save(self, user_id: str, value: dict, ttl: float):
+        try:
+            self.backend.write_pending(self.kind, user_id, json.dumps(value, default=str), time.time() + ttl)
+        except Exception as e:
+            logger.error(f"Could not persist pending {self.kind} for userId={user_id}: {e}")
+
+    def delete(self, user_id: str):
+        try:
+            self.backend.write_pending(self.kind, user_id, None)
+        except Exception as e:
+            logger.error(f"Could not delete pending {self.kind} for userId={user_id}: {e}")
+
+
+def open_session_store(state_dir: Path) -> SessionStore:
+    kind = os.environ.get("IG_SESSION_STORE", "sqlite").lower()
+    if kind == "file":
+        backend = FileBackend(state_dir)
+    else:
+        backend = SQLiteBackend(state_dir / "ig_sessions.sqlite3", legacy_dir=state_dir)
+    return SessionStore(backend, flush_interval=float(os.environ.get("IG_SESSION_FLUSH_INTERVAL", "0.5")))
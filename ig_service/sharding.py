@@ -0,0 +1,51 @@
+"""
+Consistent-hash assignment of accounts (user_id) to worker processes.
+
+Each worker gets IG_RING_REPLICAS points on a 64-bit ring; an account belongs to
+the first point at or after the hash of its user_id. Growing from N to N+1
+workers moves about 1/(N+1) of the accounts instead of reshuffling all of them.
+The supervisor (cluster.py) and every worker build the same ring from the same
+settings, so they agree on ownership without talking to each other.
+"""
+
+import bisect
+import hashlib
+import os
+from typing import Optional
+
+IG_WORKERS = int(os.environ.get("IG_WORKERS", "1"))
+IG_WORKER_INDEX = int(os.environ.get("IG_WORKER_INDEX", "0"))
+IG_RING_REPLICAS = int(os.environ.get("IG_RING_REPLICAS", "160"))
+
+
+def _hash(key: str) -> int:
+    return int.from_bytes(hashlib.blake2b(key.encode("utf-8"), digest_size=8).digest(), "big")
+
+
+class HashRing:
+    def __init__(self, nodes: list[int], replicas: int = IG_RING_REPLICAS):
+        points = sorted((_hash(f"worker-{node}#{r}"), node) for node in nodes for r in range(replicas))
+        self.nodes = list(nodes)
+        self._keys = [p[0] for p in points]
+        self._nodes = [p[1] for p in points]
+
+    def node_for(self, key: str) -> Optional[int]:
+        if not self._keys:
+            return None
+        i = bisect.bisect_left(self._keys, _hash(key))
+        return self._nodes[i % len(self._nodes)]
+
+    def __len__(self) -> int:
+        return len(self.nodes)
+
+
+ring = HashRing(list(range(max(1, IG_WORKERS))))
+
+
+def owner_of(user_id: str) -> int:
+    return ring.node_for(str(user_id))
+
+
+def owns(user_id: str) -> bool:
+    """True when this process is the worker assigned to user_id (always, with one worker)."""
+    return IG_WORKERS <= 1 or owner_of(user_id) == IG_WORKER_INDEX
@@ -0,0 +1,269 @@
+"""
+Per-request span tracing and a sampling profiler, to find where a slow request's time went.
+
+TracingMiddleware gives every HTTP request a Trace. Code on the request's path
+times its steps with span(name, **attrs): blocking instagrapi calls, upstream HTTP
+requests and their retries, sleeps, formatting and JSON encoding. Worker threads
+run in a copy of the request's context, so their spans land in the same trace.
+A span costs two perf_counter calls and a list append; outside a request it does
+nothing.
+
+Every response carries a Server-Timing header with the time spent per span
+category (the part of the name before the first dot). Requests slower than
+IG_SLOW_REQUEST_MS are logged with their longest spans.
+
+Profiler samples the Python stacks of all threads (sys._current_frames) and
+returns them as folded stacks, the input of flamegraph.pl and speedscope.
+"""
+
+import contextvars
+import logging
+import os
+import re
+import sys
+import threading
+import time
+from contextlib import contextmanager
+from typing import Optional
+
+from metrics import IG_SLOW_REQUESTS
+
+logger = logging.getLogger("ig_service")
+
+# Requests at least this slow are logged with their spans (0 disables the log)
+IG_SLOW_REQUEST_MS = int(os.environ.get("IG_SLOW_REQUEST_MS", "10000"))
+# Spans kept per request; a long pagination records a few per page
+IG_TRACE_MAX_SPANS = int(os.environ.get("IG_TRACE_MAX_SPANS", "2000"))
+# Longest spans listed in a slow-request log
+SLOW_LOG_SPANS = 25
+
+
+class Span:
+    __slots__ = ("name", "start", "duration", "parent", "attrs")
+
+    def __init__(self, name: str, start: float, parent: Optional["Span"], attrs: dict):
+        self.name = name
+        self.start = start  # seconds since the request started
+        self.duration: Optional[float] = None  # None while running
+        self.parent = parent
+        self.attrs = attrs
+
+
+class Trace:
+    def __init__(self, method: str, path: str):
+        self.method = method
+        self.path = path
+        self.start = time.perf_counter()
+        self.spans: list[Span] = []
+        self.dropped = 0
+        self._lock = threading.Lock()
+
+    def add(self, span: Span) -> bool:
+        with self._lock:
+            if len(self.spans) >= IG_TRACE_MAX_SPANS:
+                self.dropped += 1
+                return False
+            self.spans.append(span)
+            return True
+
+    def totals(self) -> dict[str, list]:
+        """[count, seconds] per span category, finished spans only."""
+        out: dict[str, list] = {}
+        with self._lock:
+            spans = list(self.spans)
+        for s in spans:
+            if s.duration is not None:
+                entry = out.setdefault(s.name.partition(".")[0], [0, 0.0])
+                entry[0] += 1
+                entry[1] += s.duration
+        return out
+
+    def server_timing(self) -> str:
+        parts = [f'{cat};dur={seconds * 1000:.1f};desc="{count}x"' for cat, (count, seconds) in self.totals().items()]
+        parts.append(f"total;dur={(time.perf_counter() - self.start) * 1000:.1f}")
+        return ", ".join(parts)
+
+    def report(self, status: int, elapsed: float) -> str:
+        """Slow-request log: category totals, then the longest spans in start order."""
+        totals = ", ".join(f"{cat} {count}x {seconds:.2f}s" for cat, (count, seconds)
+                           in sorted(self.totals().items(), key=lambda kv: -kv[1][1]))
+        lines = [f"🐢 Slow request {self.method} {self.path} -> {status} in {elapsed:.2f}s | {totals or 'no spans'}"]
+        with self._lock:
+            spans = list(self.spans)
+        longest = sorted(spans, key=lambda s: -(elapsed - s.start if s.duration is None else s.duration))[:SLOW_LOG_SPANS]
+        for s in sorted(longest, key=lambda s: s.start):
+            depth, parent = 0, s.parent
+            while parent is not None:
+                depth, parent = depth + 1, parent.parent
+            took = "running" if s.duration is None else f"{s.duration:.3f}s"
+            attrs = " ".join(f"{k}={v}" for k, v in s.attrs.items())
+            lines.append(f"    +{s.start:.3f}s {took:>9} {'  ' * depth}{s.name}{' ' + attrs if attrs else ''}")
+        hidden = len(spans) - len(longest)
+        if hidden or self.dropped:
+            lines.append(f"    ({hidden} shorter spans not shown, {self.dropped} over IG_TRACE_MAX_SPANS not recorded)")
+        return "\n".join(lines)
+
+
+_trace: contextvars.ContextVar[Optional[Trace]] = contextvars.ContextVar("ig_trace", default=None)
+_current: contextvars.ContextVar[Optional[Span]] = contextvars.ContextVar("ig_span", default=None)
+
+
+@contextmanager
+def span(name: str, **attrs):
+    """Time the block as a span of the current request's trace. Yields the Span, whose attrs can be added to."""
+    trace = _trace.get()
+    if trace is None:
+        yield Span(name, 0.0, None, attrs)
+        return
+    s = Span(name, time.perf_counter() - trace.start, _current.get(), attrs)
+    if not trace.add(s):
+        yield s
+        return
+    token = _current.set(s)
+    try:
+        yield s
+    except BaseException as e:
+        s.attrs.setdefault("error", type(e).__name__)
+        raise
+    finally:
+        s.duration = time.perf_counter() - trace.start - s.start
+        _current.reset(token)
+
+
+def event(name: str, **attrs):
+    """Record an instant (zero-length span), e.g. a retry decision."""
+    trace = _trace.get()
+    if trace is not None:
+        s = Span(name, time.perf_counter() - trace.start, _current.get(), {k: v for k, v in attrs.items() if v is not None})
+        s.duration = 0.0
+        trace.add(s)
+
+
+def record(name: str, started: float, **attrs):
+    """Record a span that began at perf_counter() time started and ends now, e.g. a wait measured after the fact."""
+    trace = _trace.get()
+    if trace is not None:
+        s = Span(name, started - trace.start, _current.get(), attrs)
+        s.duration = time.perf_counter() - started
+        trace.add(s)
+
+
+def traced(name: str, func):
+    """func wrapped in span(name)."""
+    def wrapper(*args, **kwargs):
+        with span(name):
+            return func(*args, **kwargs)
+
+    wrapper.__name__ = getattr(func, "__name__", name)
+    wrapper.__doc__ = func.__doc__
+    return wrapper
+
+
+@contextmanager
+def detached():
+    """Tasks and contexts created inside the block are not part of the current request's trace."""
+    trace_token, span_token = _trace.set(None), _current.set(None)
+    try:
+        yield
+    finally:
+        _current.reset(span_token)
+        _trace.reset(trace_token)
+
+
+class TracingMiddleware:
+    """ASGI middleware giving each HTTP request a Trace (see module docstring)."""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+        trace = Trace(scope.get("method", ""), scope.get("path", ""))
+        token = _trace.set(trace)
+        status = {"code": 500}
+
+        async def _send(message):
+            if message["type"] == "http.response.start":
+                status["code"] = message["status"]
+                headers = list(message.get("headers") or ())
+                headers.append((b"server-timing", trace.server_timing().encode("latin-1")))
+                message = {**message, "headers": headers}
+            await send(message)
+
+        try:
+            await self.app(scope, receive, _send)
+        finally:
+            _trace.reset(token)
+            elapsed = time.perf_counter() - trace.start
+            # /debug/profile is slow on purpose
+            if IG_SLOW_REQUEST_MS and elapsed * 1000 >= IG_SLOW_REQUEST_MS and not trace.path.startswith("/debug/"):
+                IG_SLOW_REQUESTS.inc(route=getattr(scope.get("route"), "path", None) or "unmatched")
+                logger.warning(trace.report(status["code"], elapsed))
+
+
+# ─── Sampling profiler ────────────────────────────────────
+
+# Innermost frames of threads that are only waiting for work or I/O readiness
+_IDLE_FRAMES = {
+    ("threading.py", "wait"),
+    ("selectors.py", "select"),
+    ("thread.py", "_worker"),
+    ("queue.py", "get"),
+}
+_THREAD_SUFFIX = re.compile(r"[-_]\d+$")
+
+# One profile at a time per process
+_profiling = threading.Lock()
+
+
+class Profiler:
+    """
+    Samples every thread's stack each interval seconds from a background thread.
+    Threads are named by pool (ig-worker, ig-chunk...), so one flame per pool.
+    Idle threads are left out unless idle=True.
+    """
+
+    def __init__(self, interval: float, idle: bool = False):
+        self.interval = interval
+        self.idle = idle
+        self.samples = 0
+        self._stacks: dict[str, int] = {}
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="ig-profiler", daemon=True)
+
+    def start(self) -> bool:
+        """False if another profile is already running."""
+        if not _profiling.acquire(blocking=False):
+            return False
+        self._thread.start()
+        return True
+
+    def stop(self) -> str:
+        """Stop sampling and return the folded stacks ("thread;outer;...;inner count" lines)."""
+        self._stop.set()
+        self._thread.join()
+        _profiling.release()
+        return "".join(f"{stack} {count}\n" for stack, count in sorted(self._stacks.items()))
+
+    def _run(self):
+        me = threading.get_ident()
+        names: dict[int, str] = {}
+        while not self._stop.wait(self.interval):
+            self.samples += 1
+            for ident, frame in sys._current_frames().items():
+                if ident == me:
+                    continue
+                code = frame.f_code
+                if not self.idle and (os.path.basename(code.co_filename), code.co_name) in _IDLE_FRAMES:
+                    continue
+                if ident not in names:
+                    names = {t.ident: _THREAD_SUFFIX.sub("", t.name) for t in threading.enumerate()}
+                stack = []
+                while frame is not None:
+                    code = frame.f_code
+                    stack.append(f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})")
+                    frame = frame.f_back
+                stack.append(names.get(ident, "thread"))
+                key = ";".join(reversed(stack))
+                self._stacks[key] = self._stacks.get(key, 0) + 1
@@ -0,0 +1,80 @@
+"""
+Replacement for instagrapi 2.2.1's extract_user_gql, installed by main.py.
+
+The shipped extractor rejects **kwargs (update_headers=), crashes when
+pinned_channels_info is missing and fails on bio links without link_id. This
+version never mutates the payload, derives link ids from the user pk instead of
+uuid4 and builds the User with a single validation pass (pydantic-core ignores
+the unknown GQL keys). Only if that pass fails is a minimal User built from
+sanitized fields without validation, so a malformed profile never raises.
+"""
+
+from instagrapi.types import User
+
+
+def _is_url(value) -> bool:
+    return isinstance(value, str) and value.startswith(("https://", "http://"))
+
+
+def _edge_count(data: dict, edge: str):
+    node = data.get(edge)
+    return node.get("count", 0) if isinstance(node, dict) else 0
+
+
+def _as_int(value) -> int:
+    return value if type(value) is int else 0
+
+
+def _bio_links(pk: str, links) -> list:
+    out = []
+    for i, link in enumerate(links or ()):
+        if not isinstance(link, dict) or not isinstance(link.get("url"), str):
+            continue
+        if "link_id" not in link:
+            # Stable synthetic id instead of a uuid4 per link
+            link = {**link, "link_id": f"{pk}:{i}"}
+        out.append(link)
+    return out
+
+
+def _broadcast_channels(data: dict) -> list:
+    info = data.get("pinned_channels_info")
+    channels = info.get("pinned_channels_list") if isinstance(info, dict) else None
+    return [ch for ch in channels if isinstance(ch, dict)] if isinstance(channels, list) else []
+
+
+def extract_user_gql(data: dict, **kwargs) -> User:
+    raw_pk = data.get("id", data.get("pk"))
+    pk = str(raw_pk) if raw_pk is not None else "0"
+    fields = {
+        **data,
+        "pk": pk,
+        "media_count": _edge_count(data, "edge_owner_to_timeline_media"),
+        "follower_count": _edge_count(data, "edge_followed_by"),
+        "following_count": _edge_count(data, "edge_follow"),
+        "is_business": bool(data.get("is_business_account", False)),
+        "public_email": data.get("business_email", ""),
+        "contact_phone_number": data.get("business_phone_number", ""),
+        "bio_links": _bio_links(pk, data.get("bio_links")),
+        "broadcast_channel": _broadcast_channels(data),
+    }
+    try:
+        return User.model_validate(fields)
+    except Exception:
+        pass
+    # Last resort: only the fields the service reads, sanitized and not
+    # validated again (profile_pic_url is required but may be unusable)
+    biography = data.get("biography")
+    return User.model_construct(**{
+        "pk": pk,
+        "username": fields.get("username") if isinstance(fields.get("username"), str) else "",
+        "full_name": fields.get("full_name") if isinstance(fields.get("full_name"), str) else "",
+        "is_private": fields.get("is_private") is True,
+        "is_verified": fields.get("is_verified") is True,
+        "profile_pic_url": fields.get("profile_pic_url") if _is_url(fields.get("profile_pic_url")) else None,
+        "media_count": _as_int(fields["media_count"]),
+        "follower_count": _as_int(fields["follower_count"]),
+        "following_count": _as_int(fields["following_count"]),
+        "biography": biography if isinstance(biography, str) else "",
+        "is_business": fields["is_business"],
+    })